@@ -0,0 +1,224 @@
+"""
+Network-adaptive JPEG quality and resolution
+Steps the stream down when viewers cannot keep up and back up when they can
+"""
+import statistics
+import threading
+import time
+
+
+class ViewerDrain:
+    """Delivery counters for one viewer over the current window"""
+
+    def __init__(self):
+        self.last_number = None
+        self.delivered = 0
+        self.missed = 0
+        self.send_time = 0.0
+        self.age_total = 0.0
+        self.aged = 0
+
+    def ratio(self):
+        """Fraction of published frames the viewer actually received"""
+        total = self.delivered + self.missed
+        return self.delivered / total if total else 1.0
+
+    def mean_age(self):
+        """Average seconds from capture until a frame had been sent, None if unknown"""
+        return self.age_total / self.aged if self.aged else None
+
+    def reset(self):
+        self.delivered = 0
+        self.missed = 0
+        self.send_time = 0.0
+        self.age_total = 0.0
+        self.aged = 0
+
+
+class AdaptiveQualityController:
+    """
+    Closed-loop controller for JPEG quality and output scale
+
+    Every viewer reports the frames it sends and how old each one was
+    once it had drained (left the server's send buffer, or was acked on
+    /ws/video). Two signals come out of that per window: the delivery
+    ratio, since a viewer whose link cannot keep up skips frame numbers in
+    its send slot, and the mean frame age, which grows with the time a
+    frame takes to cross the link even before frames are skipped.
+    The median viewer drives the decision, with ties going to the healthier
+    one, so the stream only steps down when at least half of its viewers
+    struggle: a single slow viewer (often limited by how fast it renders,
+    which smaller frames do not fix) never degrades everyone else, and
+    keeps getting fewer but current frames through its send slot.
+    Quality is lowered first and the scale after it; recovery happens in
+    reverse order and only after several good windows in a row.
+    """
+
+    def __init__(self, quality=85, min_quality=40, max_quality=85, quality_step=10,
+                 scale=1.0, min_scale=0.5, max_scale=1.0, scale_step=0.25,
+                 window=2.0, degrade_below=0.8, upgrade_above=0.95,
+                 degrade_age=0.25, upgrade_age=0.1, upgrade_windows=3,
+                 clock=time.monotonic):
+        """
+        Args:
+            quality: initial JPEG quality
+            min_quality, max_quality: quality bounds
+            quality_step: quality change per decision
+            scale: initial output scale (1.0 = capture resolution)
+            min_scale, max_scale: scale bounds
+            scale_step: scale change per decision
+            window: seconds of delivery statistics per decision
+            degrade_below: step down when the median delivery ratio is lower
+            upgrade_above: step up when the median delivery ratio is higher
+            degrade_age: step down when the median mean frame age (seconds)
+                is higher
+            upgrade_age: step up only while the median mean frame age is lower
+            upgrade_windows: consecutive good windows needed to step up
+            clock: monotonic clock in seconds
+        """
+        if not min_quality <= max_quality or not 0 < min_scale <= max_scale:
+            raise ValueError("Adaptive quality bounds are inverted")
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.quality_step = quality_step
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale_step = scale_step
+        self.window = window
+        self.degrade_below = degrade_below
+        self.upgrade_above = upgrade_above
+        self.degrade_age = degrade_age
+        self.upgrade_age = upgrade_age
+        self.upgrade_windows = upgrade_windows
+        self.clock = clock
+
+        self.quality = max(min_quality, min(max_quality, quality))
+        self.scale = max(min_scale, min(max_scale, scale))
+        self.viewers = set()
+        self.lock = threading.Lock()
+        self.window_start = clock()
+        self.good_windows = 0
+        self.ratio = 1.0
+        self.age = None
+        self.worst_ratio = 1.0
+        self.worst_age = None
+        self.last_decision = 'hold'
+        self.decisions = 0
+
+    def settings(self):
+        """Current (quality, scale) for the encoder"""
+        # Also closes windows while no viewer gets anything through
+        with self.lock:
+            self._maybe_decide()
+            return self.quality, self.scale
+
+    def add_viewer(self):
+        """Start tracking a viewer"""
+        viewer = ViewerDrain()
+        with self.lock:
+            self.viewers.add(viewer)
+        return viewer
+
+    def remove_viewer(self, viewer):
+        """Stop tracking a viewer"""
+        with self.lock:
+            self.viewers.discard(viewer)
+
+    def record(self, viewer, number, send_time=0.0, age=None):
+        """
+        Record a frame delivered to a viewer
+
+        Args:
+            viewer: ViewerDrain from add_viewer()
+            number: broadcaster frame number that was sent
+            send_time: seconds the send took to drain
+            age: seconds from capture until the frame had drained
+        """
+        with self.lock:
+            if viewer.last_number is not None and number > viewer.last_number + 1:
+                viewer.missed += number - viewer.last_number - 1
+            viewer.last_number = number
+            viewer.delivered += 1
+            viewer.send_time += send_time
+            if age is not None:
+                viewer.age_total += age
+                viewer.aged += 1
+            self._maybe_decide()
+
+    def _maybe_decide(self):
+        now = self.clock()
+        if now - self.window_start >= self.window:
+            self._decide()
+            self.window_start = now
+
+    def _decide(self):
+        """Adjust quality/scale from the window that just ended"""
+        if not self.viewers:
+            return
+        ratios = [viewer.ratio() for viewer in self.viewers]
+        ages = [age for age in (viewer.mean_age() for viewer in self.viewers) if age is not None]
+        # Medians that break ties towards the healthier viewer
+        self.ratio = statistics.median_high(ratios)
+        self.age = statistics.median_low(ages) if ages else None
+        self.worst_ratio = min(ratios)
+        self.worst_age = max(ages) if ages else None
+        for viewer in self.viewers:
+            viewer.reset()
+
+        too_old = self.age is not None and self.age > self.degrade_age
+        fresh = self.age is None or self.age <= self.upgrade_age
+        if self.ratio < self.degrade_below or too_old:
+            self.good_windows = 0
+            self._step_down()
+        elif self.worst_ratio >= self.upgrade_above and fresh:
+            self.good_windows += 1
+            if self.good_windows >= self.upgrade_windows:
+                self.good_windows = 0
+                self._step_up()
+            else:
+                self.last_decision = 'hold'
+        else:
+            self.good_windows = 0
+            self.last_decision = 'hold'
+
+    def _step_down(self):
+        if self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - self.quality_step)
+            self.last_decision = 'quality down'
+        elif self.scale > self.min_scale:
+            self.scale = max(self.min_scale, self.scale - self.scale_step)
+            self.last_decision = 'scale down'
+        else:
+            self.last_decision = 'at minimum'
+            return
+        self.decisions += 1
+
+    def _step_up(self):
+        if self.scale < self.max_scale:
+            self.scale = min(self.max_scale, self.scale + self.scale_step)
+            self.last_decision = 'scale up'
+        elif self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + self.quality_step)
+            self.last_decision = 'quality up'
+        else:
+            self.last_decision = 'at maximum'
+            return
+        self.decisions += 1
+
+    def state(self):
+        """Current decisions and bounds"""
+        with self.lock:
+            return {
+                'quality': self.quality,
+                'scale': self.scale,
+                'quality_bounds': [self.min_quality, self.max_quality],
+                'scale_bounds': [self.min_scale, self.max_scale],
+                'viewers': len(self.viewers),
+                'delivery_ratio': round(self.ratio, 3),
+                'frame_age_ms': round(self.age * 1000, 1) if self.age is not None else None,
+                'worst_delivery_ratio': round(self.worst_ratio, 3),
+                'worst_frame_age_ms': (round(self.worst_age * 1000, 1)
+                                       if self.worst_age is not None else None),
+                'last_decision': self.last_decision,
+                'decisions': self.decisions,
+            }
@@ -2,6 +2,18 @@ import time
 import io
 import threading
 
+from adaptive_quality import AdaptiveQualityController
+from event_log import get_logger
+from frame_broadcaster import FrameBroadcaster
+from frame_pacer import FramePacer
+from frame_pipeline import DropOldestQueue, ReorderBuffer
+from frame_sources import ReplayCamera, SyntheticCamera
+from metrics import (ACTIVE_VIEWERS, CAPTURE_SECONDS, ENCODE_SECONDS, FRAMES_DROPPED,
+                     FRAMES_PRODUCED, JPEG_BYTES, PUBLISH_SECONDS)
+from stream_profiles import DEFAULT_PROFILES, downscale
+
+log = get_logger('camera')
+
 # Try to import the real Picamera2; if unavailable provide a minimal stub
 try:
     from picamera2 import Picamera2
@@ -10,7 +22,7 @@ except Exception:
     class Picamera2:
         def __init__(self):
             pass
-        def create_preview_configuration(self, main=None):
+        def create_preview_configuration(self, main=None, transform=None):
             # return a minimal config object compatible with configure(...)
             return {}
         def configure(self, config):
@@ -38,25 +50,170 @@ except Exception:
             raise RuntimeError("Pillow (PIL) is not available on this system")
 
 
+def create_camera(backend='picamera2', size=(640, 480), fps=30, path=None):
+    """
+    Create a camera backend
+
+    Args:
+        backend: 'picamera2' for the real camera, 'synthetic' for a generated
+            test pattern or 'replay' to loop recorded frames from `path`
+        size: (width, height) of captured frames
+        fps: frame rate of the synthetic and replay backends
+        path: directory of images or MJPEG file for 'replay'
+    """
+    if backend == 'picamera2':
+        return Picamera2()
+    elif backend == 'synthetic':
+        return SyntheticCamera(size=size, fps=fps)
+    elif backend == 'replay':
+        if not path:
+            raise ValueError("The replay camera backend needs a path")
+        return ReplayCamera(path, size=size, fps=fps)
+    else:
+        raise ValueError(f"Unknown camera backend: {backend}")
+
+
+class ProfileStream:
+    """Runtime state of one simulcast profile"""
+
+    def __init__(self, profile, adaptive=None):
+        self.profile = profile
+        self.broadcaster = FrameBroadcaster()
+        self.adaptive = adaptive or AdaptiveQualityController(
+            quality=profile.quality,
+            min_quality=min(40, profile.quality),
+            max_quality=profile.quality,
+        )
+        self.next_due = 0.0
+
+        # Metrics children resolved once, gauges read at scrape time
+        name = profile.name
+        self.encode_seconds = ENCODE_SECONDS.labels(profile=name)
+        self.publish_seconds = PUBLISH_SECONDS.labels(profile=name)
+        self.frames_produced = FRAMES_PRODUCED.labels(profile=name)
+        ACTIVE_VIEWERS.labels(profile=name).set_function(lambda: len(self.broadcaster.slots))
+        JPEG_BYTES.labels(profile=name).set_function(self.latest_size)
+
+    def latest_size(self):
+        """Size in bytes of the latest encoded frame"""
+        frame = self.broadcaster.latest
+        return len(frame.data) if frame is not None else None
+
+    def is_active(self):
+        """True while at least one viewer is subscribed to this profile"""
+        return self.broadcaster.is_active()
+
+    def is_due(self, now, tolerance):
+        """Apply the profile's frame rate cap to a frame captured at `now` (monotonic)"""
+        if not self.profile.max_fps:
+            return True
+        if now + tolerance < self.next_due:
+            return False
+        period = 1.0 / self.profile.max_fps
+        self.next_due += period
+        if self.next_due <= now:
+            # Behind after an idle gap: restart the cadence from this frame
+            self.next_due = now + period
+        return True
+
+    def stats(self):
+        return {
+            'profile': self.profile.describe(),
+            'frame_number': self.broadcaster.number,
+            'adaptive': self.adaptive.state(),
+            'viewers': self.broadcaster.stats(),
+        }
+
+
 class CameraStreamer:
-    """Handles MJPEG camera streaming"""
+    """
+    Handles MJPEG camera streaming
+
+    Frames flow through a staged pipeline: one capture thread paces the
+    camera and hands raw arrays to a pool of encode threads through a
+    drop-oldest queue. Encoded frames are published in capture order.
+
+    Each captured frame is encoded once per stream profile, and only for
+    profiles that currently have viewers.
+    """
     
-    def __init__(self):
-        self.init_camera()
+    def __init__(self, fps=30, encode_workers=3, queue_size=None, adaptive=None,
+                 profiles=None, backend='picamera2', size=(640, 480), source_path=None,
+                 recorder=None, scene_detector=None, open_camera=True):
+        """
+        Args:
+            fps: target capture frame rate
+            encode_workers: number of JPEG encode threads
+            queue_size: frames waiting for an encoder before the oldest is
+                dropped (defaults to one per encode worker)
+            adaptive: AdaptiveQualityController for the default profile
+                (each profile gets a default one if omitted)
+            profiles: StreamProfile list; the first one is the default
+            backend: camera backend, see create_camera()
+            size: (width, height) to capture
+            source_path: recording to play back with the 'replay' backend
+            recorder: FrameRingBuffer that keeps recent default-profile frames
+            scene_detector: SceneChangeDetector used to skip encoding
+                frames of an unchanged scene
+            open_camera: open and configure the camera now; if False it is
+                opened by init_camera() or the first start()
+        """
+        self.recorder = recorder
+        self.scene_detector = scene_detector
+        self.backend = backend
+        self.size = tuple(size)
+        self.source_path = source_path
+        profiles = profiles or DEFAULT_PROFILES
+        self.streams = {}
+        for profile in profiles:
+            self.streams[profile.name] = ProfileStream(profile)
+        self.default_profile = profiles[0].name
+        if adaptive is not None:
+            self.streams[self.default_profile].adaptive = adaptive
 
-    def init_camera(self):
-        self.camera = Picamera2()
+        self.pacer = FramePacer(fps)
+        self.encode_workers = encode_workers
+        self.encode_queue = DropOldestQueue(queue_size or encode_workers)
+        self.reorder = ReorderBuffer(self._publish)
+        self.threads = []
+        self.queue_drops = 0
+        self.queue_drop_counter = FRAMES_DROPPED.labels(stage='encode_queue')
+        self.camera = None
+        self.warmed_up = False
         self.frame = None
         self.lock = threading.Lock()
         self.running = False
+        if open_camera:
+            self.init_camera()
+
+    @property
+    def broadcaster(self):
+        """Broadcaster of the default profile"""
+        return self.streams[self.default_profile].broadcaster
+
+    @property
+    def adaptive(self):
+        """Adaptive quality controller of the default profile"""
+        return self.streams[self.default_profile].adaptive
+
+    def get_stream(self, name=None):
+        """Get a profile stream by name (None for the default profile)"""
+        return self.streams.get(name or self.default_profile)
+
+    def init_camera(self):
+        camera = create_camera(self.backend, self.size, self.pacer.target_fps,
+                               self.source_path)
+        self.warmed_up = False
         
         # Configure camera
-        config = self.camera.create_preview_configuration(
-            main={"size": (640, 480), "format": "RGB888"}, 
+        config = camera.create_preview_configuration(
+            main={"size": self.size, "format": "RGB888"}, 
             transform=Transform(hflip=1, vflip=1)
         )
-        self.camera.configure(config)
-        print("✓ Camera configured")
+        camera.configure(config)
+        self.camera = camera
+        log.info('camera_configured', backend=self.backend,
+                 size=f"{self.size[0]}x{self.size[1]}")
     
     def start(self):
         """Start camera capture"""
@@ -64,45 +221,158 @@ class CameraStreamer:
             self.init_camera()
             
         self.running = True
+        self.pacer.reset()
+        if self.scene_detector is not None:
+            self.scene_detector.reset()
+        self.reorder.clear()
+        self.encode_queue.clear()
+        self.encode_queue.open()
         self.camera.rotate = 180
-        self.camera.start()
-        time.sleep(2)  # Camera warm-up
+        try:
+            self.camera.start()
+        except Exception:
+            self.running = False
+            raise
+        if not self.warmed_up:
+            # Sensor warm-up; a camera restarted from standby keeps its settings
+            time.sleep(getattr(self.camera, 'warmup_time', 2))
+            self.warmed_up = True
         
-        thread = threading.Thread(target=self._capture_loop)
-        thread.daemon = True
-        thread.start()
-        print("✓ Camera streaming started")
+        self.threads = [threading.Thread(target=self._capture_loop, daemon=True)]
+        for _ in range(self.encode_workers):
+            self.threads.append(threading.Thread(target=self._encode_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        log.info('camera_streaming', encode_workers=self.encode_workers)
     
     def _capture_loop(self):
-        """Capture frames continuously"""
+        """Capture frames continuously and queue them for encoding"""
+        number = 0
         while self.running:
+            # Wait for this frame's deadline; late frames are skipped
+            self.pacer.wait()
             try:
-                # Capture frame
+                started = time.perf_counter()
                 array = self.camera.capture_array()
-                img = Image.fromarray(array)
-                
-                # Convert to JPEG
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=85, optimize=True)
-                
-                with self.lock:
-                    self.frame = buffer.getvalue()
-                
-                time.sleep(0.033)  # ~30 FPS
+                CAPTURE_SECONDS.observe(time.perf_counter() - started)
             except Exception as e:
-                print(f"Camera error: {e}")
+                log.error('camera_error', error=e)
                 time.sleep(0.1)
+                continue
+
+            # Only profiles with viewers, and within their FPS cap, get encoded
+            active = [stream for stream in self.streams.values() if stream.is_active()]
+            if not active:
+                continue
+            timestamp = time.time()
+            tolerance = self.pacer.period / 2
+            now = time.monotonic()
+            streams = [stream for stream in active if stream.is_due(now, tolerance)]
+            luma = None
+            if streams and self.scene_detector is not None:
+                # An unchanged scene reuses the profile's previous encoded frame
+                luma = self.scene_detector.luma(array)
+                streams = [stream for stream in streams
+                           if self.scene_detector.should_encode(luma, stream.profile.name)]
+            if not streams:
+                continue
+
+            number += 1
+            self.reorder.reserve(number)
+            dropped = self.encode_queue.put((number, array, timestamp, streams, luma))
+            if dropped is not None:
+                # Encoders are saturated: the oldest frame gives way
+                self.queue_drops += 1
+                self.queue_drop_counter.inc()
+                self.reorder.cancel(dropped[0])
+
+    def _encode_loop(self):
+        """Encode queued frames to JPEG, once per requested profile"""
+        while self.running:
+            item = self.encode_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            number, array, timestamp, streams, luma = item
+            try:
+                frames = []
+                for stream in streams:
+                    started = time.perf_counter()
+                    jpeg = self._encode(array, stream)
+                    encode_time = time.perf_counter() - started
+                    stream.encode_seconds.observe(encode_time)
+                    frames.append((stream, jpeg, encode_time))
+            except Exception as e:
+                log.error('encode_error', frame=number, error=e)
+                self.reorder.cancel(number)
+                continue
+            self.reorder.complete(number, (frames, timestamp, luma))
+
+    def _encode(self, array, stream):
+        """Convert a captured array to JPEG for one profile (as a buffer view)"""
+        quality, scale = stream.adaptive.settings()
+        height, width = array.shape[:2]
+        out_width, out_height = stream.profile.size or (width, height)
+        if scale < 1.0:
+            out_width, out_height = round(out_width * scale), round(out_height * scale)
+        img = Image.fromarray(downscale(array, (out_width, out_height)))
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+        # The broadcaster copies this view once into the shared multipart part
+        return buffer.getbuffer()
+
+    def _publish(self, result):
+        """Hand encoded frames to viewers (called in capture order)"""
+        frames, timestamp, luma = result
+        for stream, jpeg, encode_time in frames:
+            frame = stream.broadcaster.publish(jpeg, timestamp, encode_time)
+            if luma is not None:
+                # Only now does this picture become the profile's reference
+                self.scene_detector.commit(luma, stream.profile.name)
+            stream.publish_seconds.observe(time.time() - timestamp)
+            stream.frames_produced.inc()
+            if stream.profile.name == self.default_profile:
+                with self.lock:
+                    self.frame = frame.data
+                if self.recorder is not None:
+                    self.recorder.append(frame.data, timestamp)
     
+    def set_target_fps(self, fps):
+        """Change the capture frame rate at runtime"""
+        self.pacer.set_fps(fps)
+
+    def stats(self):
+        """Get capture statistics"""
+        stats = self.pacer.stats()
+        stats['running'] = self.running
+        stats['frame_number'] = self.broadcaster.number
+        stats['encode_workers'] = self.encode_workers
+        stats['queue_drops'] = self.queue_drops
+        stats['adaptive'] = self.adaptive.state()
+        stats['viewers'] = self.broadcaster.stats()
+        if self.scene_detector is not None:
+            stats['scene'] = self.scene_detector.stats()
+        stats['profiles'] = {name: stream.stats() for name, stream in self.streams.items()}
+        return stats
+
     def get_frame(self):
         """Get latest frame"""
         with self.lock:
             return self.frame
     
     def stop(self):
-        """Stop camera"""
+        """Stop capturing but keep the camera configured for a quick restart"""
         self.running = False
-        self.camera.stop()
-        self.camera.close()
-        self.camera = None
-# Global camera streamer instance
-camera_streamer = CameraStreamer()
+        self.encode_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self.threads = []
+        if self.camera:
+            self.camera.stop()
+
+    def close(self):
+        """Stop camera and release it completely"""
+        if self.running:
+            self.stop()
+        if self.camera:
+            self.camera.close()
+            self.camera = None
@@ -0,0 +1,99 @@
+"""
+Async camera lifecycle
+Starts and stops the camera off the event loop and keeps it warm between viewers
+"""
+import asyncio
+
+from event_log import get_logger
+
+log = get_logger('camera')
+
+
+class CameraLifecycle:
+    """
+    Reference-counted camera start/stop for async handlers
+
+    The blocking start() (including the sensor warm-up) and stop() run in a
+    worker thread so the event loop keeps serving WebSocket control messages.
+    When the last user releases the camera it keeps running for `linger`
+    seconds, so page refreshes and quick reconnects find it already warm.
+    If `ready` is set (the app's background camera initialisation), a
+    start waits for it rather than opening the camera a second time.
+    """
+
+    DEFAULT_LINGER = 10.0
+
+    def __init__(self, streamer, linger=DEFAULT_LINGER):
+        """
+        Args:
+            streamer: CameraStreamer to manage
+            linger: seconds to keep the camera running after the last user leaves
+        """
+        self.streamer = streamer
+        self.linger = linger
+        self.users = 0
+        self.lock = asyncio.Lock()
+        self.ready = None
+        self._linger_task = None
+
+    async def acquire(self):
+        """Register a user and make sure the camera is running"""
+        self.users += 1
+        if self._linger_task is not None:
+            self._linger_task.cancel()
+            self._linger_task = None
+        if not self.streamer.running:
+            log.info('camera_start', reason='first client connected')
+        try:
+            await self._transition()
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        """
+        Unregister a user; the camera stops after the linger period
+
+        Synchronous so it can run from a cancelled handler's cleanup.
+        """
+        self.users = max(0, self.users - 1)
+        if self.users == 0 and self._linger_task is None:
+            self._linger_task = asyncio.create_task(self._linger_stop())
+
+    async def shutdown(self):
+        """Stop the camera immediately, whoever is still using it"""
+        if self._linger_task is not None:
+            self._linger_task.cancel()
+            self._linger_task = None
+        await self._transition(force_stop=True)
+
+    async def _linger_stop(self):
+        await asyncio.sleep(self.linger)
+        # Past this point the stop is committed and can no longer be cancelled
+        self._linger_task = None
+        if self.users == 0 and self.streamer.running:
+            log.info('camera_stop', reason='no clients', linger=self.linger)
+            await self._transition()
+
+    async def _transition(self, force_stop=False):
+        """Bring the camera in line with the user count, in a worker thread"""
+        # Shielded so a viewer disconnecting mid-start cannot release the
+        # lock while the camera thread is still busy
+        await asyncio.shield(asyncio.ensure_future(self._sync(force_stop)))
+
+    async def _sync(self, force_stop):
+        async with self.lock:
+            wanted = self.users > 0 and not force_stop
+            if wanted and self.ready is not None:
+                await asyncio.shield(self.ready)
+            if self.streamer.running != wanted:
+                action = self.streamer.start if wanted else self.streamer.stop
+                await asyncio.to_thread(action)
+
+    def state(self):
+        return {
+            'running': self.streamer.running,
+            'users': self.users,
+            'linger': self.linger,
+            'lingering': self._linger_task is not None,
+        }
@@ -0,0 +1,206 @@
+"""
+Control WebSocket sessions
+Heartbeats, command acknowledgements and latency statistics per /ws client
+"""
+import asyncio
+import itertools
+import struct
+import time
+
+from latency_stats import LatencyWindow
+
+# Binary control protocol, selected with this WebSocket subprotocol.
+# Each binary message is one command: sequence number, client timestamp in
+# milliseconds (any monotonic origin) and x/y scaled to int16.
+BINARY_SUBPROTOCOL = 'raspacar.control.v1'
+COMMAND = struct.Struct('!IIhh')
+COMMAND_SCALE = 32767
+
+_session_ids = itertools.count(1)
+
+
+def decode_command(data):
+    """
+    (seq, client_time_ms, x, y) from a binary command
+
+    Raises:
+        ValueError: the message is not exactly COMMAND.size bytes, or x or
+            y is -32768, outside the scaled -1..1 range
+    """
+    if len(data) != COMMAND.size:
+        raise ValueError(f"binary command must be {COMMAND.size} bytes")
+    seq, client_time, x, y = COMMAND.unpack(data)
+    if x < -COMMAND_SCALE or y < -COMMAND_SCALE:
+        raise ValueError("binary command x/y out of range")
+    return seq, client_time, x / COMMAND_SCALE, y / COMMAND_SCALE
+
+
+def encode_command(seq, client_time, x, y):
+    """Binary command, as sent by clients"""
+    return COMMAND.pack(seq & 0xFFFFFFFF, int(client_time) & 0xFFFFFFFF,
+                        round(max(-1.0, min(1.0, x)) * COMMAND_SCALE),
+                        round(max(-1.0, min(1.0, y)) * COMMAND_SCALE))
+
+
+class ControlSession:
+    """
+    State of one /ws control connection
+
+    The server pings every client at a fixed interval and measures the
+    round trip when the pong comes back. Commands carrying a `seq` are
+    acknowledged once the control loop has applied them to the motors,
+    with the receive-to-apply latency. Acks are latest-wins: if several
+    land before the sender runs, only the newest is sent, which is all the
+    client needs since it supersedes the older commands.
+
+    Commands that arrive out of order, or later than `max_age` seconds
+    behind the fastest delivery seen so far, are dropped (see admit()).
+    """
+
+    # Pings older than this many intervals are treated as lost
+    MAX_PENDING_PINGS = 8
+    # Seconds of only stale commands after which the delay baseline is re-taken
+    BASELINE_RESET = 1.0
+
+    def __init__(self, loop, client=None, protocol='json', max_age=0.5, clock=time.monotonic):
+        """
+        Args:
+            loop: event loop the WebSocket handler runs on
+            client: remote address for display
+            protocol: 'json' or 'binary'
+            max_age: extra delivery delay in seconds after which a timestamped
+                command is dropped as stale, 0 to never drop
+            clock: monotonic clock in seconds
+        """
+        self.id = next(_session_ids)
+        self.loop = loop
+        self.client = client
+        self.clock = clock
+        self.connected = clock()
+        self.last_seen = self.connected
+        self.rtt = LatencyWindow()
+        self.apply = LatencyWindow()
+        self.pings = {}
+        self.ping_ids = itertools.count(1)
+        self.pings_lost = 0
+        self.pongs = 0
+        self.protocol = protocol
+        self.max_age = max_age
+        self.last_seq = None
+        self.min_offset = None
+        self.stale_since = None
+        self.baseline_resets = 0
+        self.dropped_out_of_order = 0
+        self.dropped_stale = 0
+        self.commands = 0
+        self.pending_ack = None
+        self.wakeup = asyncio.Event()
+
+    def seen(self):
+        """Note that the client sent something"""
+        self.last_seen = self.clock()
+
+    def ping(self):
+        """Message for the next heartbeat"""
+        ping_id = next(self.ping_ids)
+        now = self.clock()
+        self.pings[ping_id] = now
+        while len(self.pings) > self.MAX_PENDING_PINGS:
+            del self.pings[next(iter(self.pings))]
+            self.pings_lost += 1
+        return {'type': 'ping', 'id': ping_id, 't': round(now * 1000, 3)}
+
+    def pong(self, message):
+        """Record the round trip of an answered ping"""
+        sent = self.pings.pop(message.get('id'), None)
+        if sent is not None:
+            self.pongs += 1
+            self.rtt.add(self.clock() - sent)
+
+    def heartbeat_capable(self):
+        """
+        True once the client has answered a ping
+
+        Only such clients can be judged by silence: a plain {"x", "y"}
+        client only sends while the joystick moves.
+        """
+        return self.pongs > 0
+
+    def admit(self, seq, client_time, x, y):
+        """
+        True if a command should be applied
+
+        Client and server clocks are never synchronised. Instead the
+        smallest (server time - client time) seen so far is taken as the
+        baseline one-way delay, and a command counts as stale when it
+        arrived more than max_age later than that baseline. Once every
+        command has been stale for BASELINE_RESET seconds, the delay itself
+        has shifted (a slower path, or the client's clock drifting) rather
+        than a burst of old commands arriving, and the baseline is re-taken
+        from the current command.
+
+        Stop commands are never dropped, neither as stale nor as out of
+        order: a late stop is still safer than the command it replaces.
+        """
+        stop = not (x or y)
+        if seq is not None:
+            if self.last_seq is not None and seq <= self.last_seq:
+                if not stop:
+                    self.dropped_out_of_order += 1
+                    return False
+            else:
+                self.last_seq = seq
+
+        if client_time is not None and self.max_age:
+            now = self.clock()
+            offset = now * 1000 - client_time
+            if self.min_offset is None or offset < self.min_offset:
+                self.min_offset = offset
+            stale = offset - self.min_offset > self.max_age * 1000
+            if not stale:
+                self.stale_since = None
+            elif self.stale_since is None:
+                self.stale_since = now
+            elif now - self.stale_since >= self.BASELINE_RESET:
+                self.min_offset = offset
+                self.stale_since = None
+                self.baseline_resets += 1
+                stale = False
+            if stale and not stop:
+                self.dropped_stale += 1
+                return False
+        return True
+
+    def applied(self, setpoint, latency):
+        """MotorControlLoop callback; runs on the control thread"""
+        self.apply.add(latency)
+        if setpoint.seq is not None:
+            ack = {'type': 'ack', 'seq': setpoint.seq, 'apply_ms': round(latency * 1000, 2)}
+            self.loop.call_soon_threadsafe(self._post_ack, ack)
+
+    def _post_ack(self, ack):
+        self.pending_ack = ack
+        self.wakeup.set()
+
+    def take_ack(self):
+        """The newest unsent ack, if any"""
+        ack, self.pending_ack = self.pending_ack, None
+        return ack
+
+    def stats(self):
+        now = self.clock()
+        return {
+            'id': self.id,
+            'client': self.client,
+            'connected_seconds': round(now - self.connected, 1),
+            'idle_seconds': round(now - self.last_seen, 1),
+            'protocol': self.protocol,
+            'commands': self.commands,
+            'dropped_out_of_order': self.dropped_out_of_order,
+            'dropped_stale': self.dropped_stale,
+            'baseline_resets': self.baseline_resets,
+            'pings_lost': self.pings_lost,
+            'heartbeat': self.heartbeat_capable(),
+            'rtt': self.rtt.stats(),
+            'apply': self.apply.stats(),
+        }
@@ -0,0 +1,253 @@
+"""
+Structured, sampled logging off the hot path
+Log records go through a queue to a background writer thread, so callers
+on the event loop or the camera threads never wait on the console or disk
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+ROOT = 'raspacar'
+
+# Per-event limits: events beyond `per_second` are counted, not written
+DEFAULT_SAMPLING = {
+    'command': 5.0,
+    'command_invalid': 1.0,
+    'camera_error': 1.0,
+    'encode_error': 1.0,
+    'motor_error': 1.0,
+}
+
+
+class EventSampler:
+    """
+    Token bucket rate limit for one event type
+
+    allow() costs a lock and a little arithmetic. Suppressed events are
+    counted and reported on the next record that gets through.
+    """
+
+    def __init__(self, per_second, clock=time.monotonic):
+        """
+        Args:
+            per_second: records allowed per second (bursts up to the same
+                number), None for no limit, 0 to drop every record
+            clock: monotonic clock in seconds
+        """
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.suppressed = 0
+        self.total_suppressed = 0
+        self.configure(per_second)
+
+    def configure(self, per_second):
+        per_second = _rate(per_second)
+        with self.lock:
+            self.per_second = per_second
+            self.tokens = max(1.0, per_second) if per_second else 0.0
+            self.updated = self.clock()
+
+    def allow(self):
+        """(allowed, number suppressed since the last allowed record)"""
+        with self.lock:
+            if self.per_second is None:
+                return True, 0
+            now = self.clock()
+            if self.per_second:
+                capacity = max(1.0, self.per_second)
+                self.tokens = min(capacity, self.tokens + (now - self.updated) * self.per_second)
+            self.updated = now
+            if self.tokens < 1.0:
+                self.suppressed += 1
+                self.total_suppressed += 1
+                return False, 0
+            self.tokens -= 1.0
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+
+
+class EventLogger:
+    """
+    Logger for named events with key=value fields
+
+    event() checks the level and the event's sampler before building the
+    record, so disabled or sampled-out events cost a method call and a
+    comparison or two.
+    """
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(f'{ROOT}.{name}' if name else ROOT)
+
+    def event(self, event, level=logging.INFO, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        allowed, suppressed = _sampler(event).allow()
+        if not allowed:
+            return
+        if suppressed:
+            fields['suppressed'] = suppressed
+        self.logger.log(level, event, extra={'fields': fields})
+
+    def debug(self, event, **fields):
+        self.event(event, logging.DEBUG, **fields)
+
+    def info(self, event, **fields):
+        self.event(event, logging.INFO, **fields)
+
+    def warning(self, event, **fields):
+        self.event(event, logging.WARNING, **fields)
+
+    def error(self, event, **fields):
+        self.event(event, logging.ERROR, **fields)
+
+
+class EventFormatter(logging.Formatter):
+    """`time level logger event key=value ...` lines"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={_format_field(value)}' for key, value in fields.items())
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the writer thread; only pass the record on
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_samplers = {}
+_samplers_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+def _sampler(event):
+    sampler = _samplers.get(event)
+    if sampler is None:
+        with _samplers_lock:
+            sampler = _samplers.setdefault(event, EventSampler(DEFAULT_SAMPLING.get(event)))
+    return sampler
+
+
+def _format_field(value):
+    if isinstance(value, float):
+        return f'{value:.3g}' if abs(value) < 1e-3 and value else f'{value:.2f}'
+    text = str(value)
+    return f'"{text}"' if ' ' in text else text
+
+
+def _rate(per_second):
+    """Validated sampling limit: a number >= 0, or None for no limit"""
+    if per_second is None:
+        return None
+    if isinstance(per_second, bool) or not isinstance(per_second, (int, float)):
+        raise TypeError(f"sampling limit must be a number or null, not {per_second!r}")
+    if not per_second >= 0:
+        raise ValueError(f"sampling limit must be >= 0, not {per_second!r}")
+    return float(per_second)
+
+
+def _level(level):
+    """Validated logging level as a number"""
+    if isinstance(level, str):
+        number = logging.getLevelName(level.upper())
+        if isinstance(number, int):
+            return number
+    elif isinstance(level, int) and not isinstance(level, bool) and level >= 0:
+        return level
+    raise ValueError(f"unknown log level {level!r}")
+
+
+def get_logger(name=None):
+    """EventLogger for a component, e.g. get_logger('control')"""
+    return EventLogger(name)
+
+
+def setup_logging(level='INFO', stream=None, queue_size=10000):
+    """
+    Route all raspacar logging through a queue to a background writer
+
+    Args:
+        level: initial level of the raspacar loggers
+        stream: output stream, stderr by default
+        queue_size: records buffered before new ones are dropped
+    """
+    global _handler, _listener
+    root = logging.getLogger(ROOT)
+    if _listener is not None:
+        root.setLevel(level)
+        return
+
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(EventFormatter())
+    log_queue = queue.Queue(queue_size)
+    _handler = DroppingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root.addHandler(_handler)
+    root.setLevel(level)
+    root.propagate = False
+
+
+def configure(levels=None, sampling=None):
+    """
+    Change logger levels and event sampling at runtime
+
+    Every value is checked before any is applied, so invalid settings
+    raise ValueError or TypeError and change nothing.
+
+    Args:
+        levels: {logger name: level}, '' for the raspacar root logger
+        sampling: {event: records per second, None for no limit}
+    """
+    for settings in (levels, sampling):
+        if settings is not None and not isinstance(settings, dict):
+            raise TypeError(f"expected an object, not {settings!r}")
+    levels = {name: _level(level) for name, level in (levels or {}).items()}
+    sampling = {event: _rate(per_second) for event, per_second in (sampling or {}).items()}
+
+    for name, level in levels.items():
+        logging.getLogger(f'{ROOT}.{name}' if name else ROOT).setLevel(level)
+    for event, per_second in sampling.items():
+        _sampler(event).configure(per_second)
+
+
+def state():
+    """Current levels, sampling limits and drop counters"""
+    loggers = {'': logging.getLevelName(logging.getLogger(ROOT).level)}
+    for name, logger in list(logging.Logger.manager.loggerDict.items()):
+        if name.startswith(ROOT + '.') and isinstance(logger, logging.Logger) and logger.level:
+            loggers[name[len(ROOT) + 1:]] = logging.getLevelName(logger.level)
+    with _samplers_lock:
+        samplers = dict(_samplers)
+    return {
+        'levels': loggers,
+        'sampling': {event: {'per_second': sampler.per_second,
+                             'suppressed': sampler.total_suppressed}
+                     for event, sampler in samplers.items()},
+        'queue_dropped': _handler.dropped if _handler is not None else 0,
+    }
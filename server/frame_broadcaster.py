@@ -0,0 +1,185 @@
+"""
+Frame broadcaster for the MJPEG stream
+Hands encoded frames from the capture thread to asyncio viewers
+"""
+import asyncio
+import struct
+import time
+
+from metrics import FRAMES_DROPPED
+
+
+# Multipart boundary used by the MJPEG stream
+BOUNDARY = 'frame'
+
+# Binary WebSocket frame header: frame number (uint32), capture timestamp
+# (float64 Unix seconds), encode time (uint32 microseconds), network order
+WS_HEADER = struct.Struct('!IdI')
+
+_viewer_drops = FRAMES_DROPPED.labels(stage='viewer')
+
+
+class Frame:
+    """
+    An encoded camera frame with its sequence number
+
+    The complete multipart part (boundary, headers, JPEG, CRLF) is built
+    once when the frame is published and shared read-only by every viewer,
+    so nothing is formatted per viewer. Sending still copies it once per
+    viewer: the response is chunked, and uvicorn joins each chunk's size
+    line, data and CRLF into one buffer (h11 and httptools alike).
+    `data` is a zero-copy view of the JPEG inside the part. The X-Frame and
+    X-Timestamp part headers (frame number, capture time in Unix seconds)
+    let clients measure frame age; browsers ignore them.
+    """
+
+    __slots__ = ('number', 'part', 'data', 'timestamp', 'encode_time', '_message')
+
+    def __init__(self, number, jpeg, timestamp, encode_time=0.0):
+        header = (b'--' + BOUNDARY.encode() + b'\r\n'
+                  b'Content-Type: image/jpeg\r\n'
+                  b'X-Frame: %d\r\n'
+                  b'X-Timestamp: %.6f\r\n'
+                  b'Content-Length: %d\r\n\r\n' % (number, timestamp, len(jpeg)))
+        self.number = number
+        self.part = b''.join((header, jpeg, b'\r\n'))
+        self.data = memoryview(self.part)[len(header):-2]
+        self.timestamp = timestamp
+        self.encode_time = encode_time
+        self._message = None
+
+    def ws_message(self):
+        """Binary WebSocket message (header + JPEG), built once on first use"""
+        if self._message is None:
+            header = WS_HEADER.pack(self.number & 0xFFFFFFFF, self.timestamp,
+                                    min(int(self.encode_time * 1e6), 0xFFFFFFFF))
+            self._message = b''.join((header, self.data))
+        return self._message
+
+
+class ViewerSlot:
+    """
+    Single-frame send slot for one viewer
+
+    Holds at most one frame waiting to be sent. A newer frame replaces an
+    unsent one (latest frame wins), so a viewer that drains slowly skips
+    frames instead of queueing stale video, and never holds up anyone else.
+    """
+
+    def __init__(self, drop_counter=_viewer_drops):
+        """
+        Args:
+            drop_counter: metric counting replaced items
+        """
+        self.drop_counter = drop_counter
+        self.frame = None
+        self.ready = asyncio.Event()
+        self.queued = 0
+        self.dropped = 0
+        self.sent = 0
+
+    def put(self, frame):
+        """Offer a frame, replacing any frame not yet sent"""
+        if self.frame is not None:
+            self.dropped += 1
+            self.drop_counter.inc()
+        self.frame = frame
+        self.queued += 1
+        self.ready.set()
+
+    async def get(self):
+        """Wait for and take the pending frame"""
+        while self.frame is None:
+            self.ready.clear()
+            await self.ready.wait()
+        frame, self.frame = self.frame, None
+        self.sent += 1
+        return frame
+
+    def stats(self):
+        """Per-viewer frame counters"""
+        return {'queued': self.queued, 'sent': self.sent, 'dropped': self.dropped}
+
+
+class FrameBroadcaster:
+    """
+    Publishes numbered frames to any number of async viewers
+
+    The capture thread calls publish(); each subscribed viewer gets the
+    frame in its own ViewerSlot, so every viewer is woken once per new
+    frame and never sees the same frame twice.
+    """
+
+    def __init__(self):
+        self.number = 0
+        self.latest = None
+        self.loop = None
+        self.slots = set()
+        self.waiters = 0
+        self._new_frame = None
+
+    def bind(self, loop):
+        """Attach the event loop that viewers run on"""
+        if self.loop is not loop:
+            self.loop = loop
+            self._new_frame = asyncio.Event()
+
+    def publish(self, jpeg, timestamp=None, encode_time=0.0):
+        """
+        Publish a new frame (safe to call from any thread)
+
+        Args:
+            jpeg: encoded JPEG (any bytes-like object)
+            timestamp: capture time, defaults to now
+            encode_time: seconds spent encoding the frame
+        """
+        self.number += 1
+        frame = Frame(self.number, jpeg, timestamp or time.time(), encode_time)
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            self.latest = frame
+            return frame
+        loop.call_soon_threadsafe(self._deliver, frame)
+        return frame
+
+    def _deliver(self, frame):
+        """Store the frame and wake every waiting viewer (runs on the loop)"""
+        self.latest = frame
+        for slot in self.slots:
+            slot.put(frame)
+        event, self._new_frame = self._new_frame, asyncio.Event()
+        event.set()
+
+    def subscribe(self):
+        """Create a send slot that receives every new frame (call on the loop)"""
+        self.bind(asyncio.get_running_loop())
+        slot = ViewerSlot()
+        if self.latest is not None:
+            slot.put(self.latest)
+        self.slots.add(slot)
+        return slot
+
+    def unsubscribe(self, slot):
+        """Stop delivering frames to a slot"""
+        self.slots.discard(slot)
+
+    def is_active(self):
+        """True while anyone is subscribed or waiting for a frame"""
+        return bool(self.slots) or self.waiters > 0
+
+    def stats(self):
+        """Counters for every subscribed viewer"""
+        return [slot.stats() for slot in self.slots]
+
+    async def wait_frame(self, after=0):
+        """Wait for the first frame numbered higher than `after`"""
+        self.bind(asyncio.get_running_loop())
+        self.waiters += 1
+        try:
+            while True:
+                frame = self.latest
+                if frame is not None and frame.number > after:
+                    return frame
+                await self._new_frame.wait()
+        finally:
+            self.waiters -= 1
@@ -0,0 +1,106 @@
+"""
+Frame pacing for the camera capture loop
+Schedules frames on absolute deadlines so encode time does not lower the rate
+"""
+import threading
+import time
+
+
+class FramePacer:
+    """
+    Paces a loop to a target frame rate
+
+    Each frame has an absolute deadline one period after the previous one,
+    so time spent capturing and encoding is absorbed instead of added to
+    the sleep. When the loop falls more than a period behind, the missed
+    deadlines are skipped rather than bursting to catch up.
+    """
+
+    # Smoothing factor for the achieved FPS and jitter averages
+    SMOOTHING = 0.1
+
+    def __init__(self, fps=30.0, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            fps: target frames per second
+            clock: monotonic clock in seconds
+            sleep: function used to wait for the next deadline
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.set_fps(fps)
+        self.reset()
+
+    def set_fps(self, fps):
+        """Change the target frame rate (takes effect on the next frame)"""
+        fps = float(fps)
+        if fps <= 0:
+            raise ValueError(f"Target FPS must be positive, got {fps}")
+        with self.lock:
+            self.target_fps = fps
+            self.period = 1.0 / fps
+
+    def reset(self):
+        """Forget the schedule and statistics (e.g. after the camera restarts)"""
+        with self.lock:
+            self.deadline = None
+            self.last_tick = None
+            self.frames = 0
+            self.skipped = 0
+            self.achieved_fps = 0.0
+            self.jitter = 0.0
+
+    def wait(self):
+        """
+        Sleep until the next frame deadline
+
+        Returns:
+            Number of frames skipped because the loop was running late
+        """
+        now = self.clock()
+        skipped = 0
+        with self.lock:
+            period = self.period
+            if self.deadline is None:
+                self.deadline = now
+            else:
+                self.deadline += period
+                late = now - self.deadline
+                if late >= period:
+                    skipped = int(late // period)
+                    self.deadline += skipped * period
+                    self.skipped += skipped
+            delay = self.deadline - now
+
+        if delay > 0:
+            self.sleep(delay)
+
+        self._record(self.clock(), period)
+        return skipped
+
+    def _record(self, tick, period):
+        """Update the achieved FPS and jitter averages"""
+        with self.lock:
+            self.frames += 1
+            if self.last_tick is not None:
+                interval = tick - self.last_tick
+                if interval > 0:
+                    a = self.SMOOTHING
+                    if self.achieved_fps == 0.0:
+                        self.achieved_fps = 1.0 / interval
+                    else:
+                        self.achieved_fps += a * (1.0 / interval - self.achieved_fps)
+                    self.jitter += a * (abs(interval - period) - self.jitter)
+            self.last_tick = tick
+
+    def stats(self):
+        """Return pacing statistics"""
+        with self.lock:
+            return {
+                'target_fps': self.target_fps,
+                'achieved_fps': round(self.achieved_fps, 2),
+                'jitter_ms': round(self.jitter * 1000, 2),
+                'frames': self.frames,
+                'skipped': self.skipped,
+            }
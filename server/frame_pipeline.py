@@ -0,0 +1,124 @@
+"""
+Building blocks for the capture/encode pipeline
+"""
+import collections
+import threading
+
+
+class DropOldestQueue:
+    """
+    Bounded FIFO between pipeline stages
+
+    put() never blocks: when the queue is full the oldest item is
+    discarded and returned, so a slow consumer only ever sees fresh items.
+    """
+
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError(f"Queue size must be at least 1, got {maxsize}")
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        """
+        Add an item
+
+        Returns:
+            The item that was dropped to make room, or None
+        """
+        with self.cond:
+            dropped = None
+            if len(self.items) >= self.maxsize:
+                dropped = self.items.popleft()
+            self.items.append(item)
+            self.cond.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """Take the oldest item; returns None on timeout or when closed"""
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if self.items:
+                return self.items.popleft()
+            return None
+
+    def clear(self):
+        """Remove and return all queued items"""
+        with self.cond:
+            items = list(self.items)
+            self.items.clear()
+            return items
+
+    def open(self):
+        """Accept items again after close()"""
+        with self.cond:
+            self.closed = False
+
+    def close(self):
+        """Wake every waiting consumer"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class ReorderBuffer:
+    """
+    Restores sequence order after parallel stages
+
+    Sequence numbers are reserved in order when work is handed out. Results
+    may complete in any order, but emit() is called in reservation order;
+    a cancelled number (dropped or failed frame) simply stops holding up
+    the ones behind it.
+    """
+
+    _CANCELLED = object()
+
+    def __init__(self, emit):
+        """
+        Args:
+            emit: called with each result, in sequence order
+        """
+        self.emit = emit
+        self.pending = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def reserve(self, number):
+        """Register a sequence number before its work is started"""
+        with self.lock:
+            self.pending[number] = None
+
+    def complete(self, number, result):
+        """Deliver the result for a reserved number"""
+        self._resolve(number, result)
+
+    def cancel(self, number):
+        """Give up on a reserved number"""
+        self._resolve(number, self._CANCELLED)
+
+    def clear(self):
+        """Forget all outstanding numbers"""
+        with self.lock:
+            self.pending.clear()
+
+    def _resolve(self, number, result):
+        with self.lock:
+            if number not in self.pending:
+                return
+            self.pending[number] = result
+            # Release the completed prefix in order
+            while self.pending:
+                head, value = next(iter(self.pending.items()))
+                if value is None:
+                    break
+                del self.pending[head]
+                if value is not self._CANCELLED:
+                    self.emit(value)
+
+    def __len__(self):
+        return len(self.pending)
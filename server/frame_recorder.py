@@ -0,0 +1,240 @@
+"""
+In-memory DVR for the camera stream
+Keeps the most recent encoded frames in a fixed-size ring and exports them
+as MJPEG or AVI without re-encoding
+"""
+import mmap
+import struct
+import threading
+from array import array
+
+# Expected JPEG bytes per pixel of the driver view (q85: 30-60 KB at 640x480)
+JPEG_BYTES_PER_PIXEL = 0.2
+
+
+class FrameRingBuffer:
+    """
+    Fixed-size ring of recent JPEG frames
+
+    Frame bytes live in one anonymous mmap of `byte_budget` bytes and the
+    index (offset, length, timestamp) in preallocated arrays, so recording
+    a frame is a copy into existing memory and never allocates. Frames are
+    written back to back and wrap to the start of the buffer; the oldest
+    frames are evicted as the write position catches up with them.
+    """
+
+    def __init__(self, byte_budget=24 * 1024 * 1024, max_frames=1800):
+        """
+        Args:
+            byte_budget: bytes reserved for frame data
+            max_frames: maximum number of frames indexed
+        """
+        self.byte_budget = byte_budget
+        self.max_frames = max_frames
+        # Anonymous mapping: pages are only committed once written
+        self.buffer = mmap.mmap(-1, byte_budget)
+        self.offsets = array('L', [0]) * max_frames
+        self.lengths = array('L', [0]) * max_frames
+        self.timestamps = array('d', [0.0]) * max_frames
+        self.lock = threading.Lock()
+        self.clear()
+
+    @classmethod
+    def for_duration(cls, seconds, fps, size, bytes_per_pixel=JPEG_BYTES_PER_PIXEL):
+        """
+        Ring sized to hold about `seconds` of video
+
+        Args:
+            seconds: recording length to hold
+            fps: capture frame rate
+            size: (width, height) of the recorded frames
+            bytes_per_pixel: expected JPEG bytes per pixel
+        """
+        frames = max(1, int(seconds * fps))
+        width, height = size
+        return cls(byte_budget=int(frames * width * height * bytes_per_pixel),
+                   max_frames=frames)
+
+    def clear(self):
+        """Drop every recorded frame"""
+        with self.lock:
+            self.first = 0      # index slot of the oldest frame
+            self.count = 0
+            self.head = 0       # byte offset of the next write
+            self.recorded = 0
+            self.evicted = 0
+            self.oversized = 0
+
+    def append(self, jpeg, timestamp):
+        """Record one encoded frame (any bytes-like object)"""
+        size = len(jpeg)
+        if size > self.byte_budget:
+            self.oversized += 1
+            return
+        with self.lock:
+            if self.head + size > self.byte_budget:
+                # Frames left in the unused tail are the oldest; once the write
+                # position wraps they no longer come first in the buffer, so
+                # drop them now or the overlap check below would stop at them
+                while self.count and self.offsets[self.first] >= self.head:
+                    self._evict_oldest()
+                self.head = 0
+            # Evict frames the new one would overwrite, and make room in the index
+            end = self.head + size
+            while self.count:
+                slot = self.first
+                start = self.offsets[slot]
+                overlaps = start < end and start + self.lengths[slot] > self.head
+                if not overlaps and self.count < self.max_frames:
+                    break
+                self._evict_oldest()
+
+            slot = (self.first + self.count) % self.max_frames
+            self.buffer[self.head:end] = jpeg
+            self.offsets[slot] = self.head
+            self.lengths[slot] = size
+            self.timestamps[slot] = timestamp
+            self.count += 1
+            self.recorded += 1
+            self.head = end
+
+    def _evict_oldest(self):
+        self.first = (self.first + 1) % self.max_frames
+        self.count -= 1
+        self.evicted += 1
+
+    def frames(self, start=None, end=None):
+        """
+        Copy out the frames recorded between two timestamps
+
+        Returns:
+            List of (timestamp, jpeg bytes), oldest first
+        """
+        selected = []
+        with self.lock:
+            for i in range(self.count):
+                slot = (self.first + i) % self.max_frames
+                timestamp = self.timestamps[slot]
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp > end:
+                    break
+                offset = self.offsets[slot]
+                selected.append((timestamp, self.buffer[offset:offset + self.lengths[slot]]))
+        return selected
+
+    def stats(self):
+        with self.lock:
+            oldest = self.timestamps[self.first] if self.count else None
+            newest = self.timestamps[(self.first + self.count - 1) % self.max_frames] if self.count else None
+            return {
+                'frames': self.count,
+                'byte_budget': self.byte_budget,
+                'max_frames': self.max_frames,
+                'oldest': oldest,
+                'newest': newest,
+                'seconds': round(newest - oldest, 2) if self.count else 0.0,
+                'recorded': self.recorded,
+                'evicted': self.evicted,
+                'oversized': self.oversized,
+            }
+
+
+def jpeg_size(data):
+    """Read (width, height) from a JPEG's SOF header"""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    raise ValueError("No JPEG frame header found")
+
+
+def nominal_fps(frames):
+    """Frame rate of the typical (median) gap between recorded frames"""
+    gaps = sorted(b[0] - a[0] for a, b in zip(frames, frames[1:]) if b[0] > a[0])
+    return 1.0 / gaps[len(gaps) // 2] if gaps else 1.0
+
+
+def frame_ticks(frames, fps):
+    """
+    Tick of `fps` at which each recorded frame starts, plus the end tick
+
+    Frames are irregularly spaced (unchanged scenes and late captures are
+    skipped), so each one is held until the tick of the next.
+    """
+    start = frames[0][0]
+    ticks = []
+    for timestamp, _ in frames:
+        tick = round((timestamp - start) * fps)
+        ticks.append(max(tick, ticks[-1] + 1) if ticks else 0)
+    ticks.append(ticks[-1] + 1)
+    return ticks
+
+
+def write_mjpeg(frames):
+    """Concatenate recorded JPEGs into a raw MJPEG stream"""
+    return b''.join(jpeg for _, jpeg in frames)
+
+
+def write_avi(frames, fps=None):
+    """
+    Wrap recorded JPEGs in an AVI (MJPG) container without re-encoding
+
+    The stream is declared at a constant `fps`; a frame held for several
+    ticks (the next one was captured later) is stored once and listed in
+    the index once per tick, so playback keeps the recorded timing.
+
+    Args:
+        frames: list of (timestamp, jpeg bytes)
+        fps: frame rate to declare, defaults to nominal_fps()
+    """
+    if not frames:
+        raise ValueError("No frames to export")
+    width, height = jpeg_size(frames[0][1])
+    fps = fps or nominal_fps(frames)
+    usec_per_frame = int(round(1000000 / fps))
+    largest = max(len(jpeg) for _, jpeg in frames)
+    ticks = frame_ticks(frames, fps)
+    count = ticks[-1]
+
+    def chunk(fourcc, payload):
+        pad = b'\0' if len(payload) % 2 else b''
+        return fourcc + struct.pack('<I', len(payload)) + payload + pad
+
+    def riff_list(fourcc, payload):
+        return b'LIST' + struct.pack('<I', len(payload) + 4) + fourcc + payload
+
+    avih = struct.pack('<14I', usec_per_frame, int(largest * fps), 0, 0x10, count,
+                       0, 1, largest, width, height, 0, 0, 0, 0)
+    strh = (b'vidsMJPG' + struct.pack('<IHHIIIIIIiI', 0, 0, 0, 0, 1000,
+                                      int(round(fps * 1000)), 0, count, largest, -1, 0)
+            + struct.pack('<4h', 0, 0, width, height))
+    strf = struct.pack('<IiiHH4sIiiII', 40, width, height, 1, 24, b'MJPG',
+                       width * height * 3, 0, 0, 0, 0)
+    hdrl = riff_list(b'hdrl', chunk(b'avih', avih)
+                     + riff_list(b'strl', chunk(b'strh', strh) + chunk(b'strf', strf)))
+
+    movi_chunks = []
+    index = []
+    offset = 4  # idx1 offsets are relative to the 'movi' fourcc
+    for i, (_, jpeg) in enumerate(frames):
+        data = chunk(b'00dc', jpeg)
+        entry = b'00dc' + struct.pack('<III', 0x10, offset, len(jpeg))
+        index.append(entry * (ticks[i + 1] - ticks[i]))
+        movi_chunks.append(data)
+        offset += len(data)
+    movi = riff_list(b'movi', b''.join(movi_chunks))
+    idx1 = chunk(b'idx1', b''.join(index))
+
+    body = b'AVI ' + hdrl + movi + idx1
+    return b'RIFF' + struct.pack('<I', len(body)) + body
@@ -0,0 +1,171 @@
+"""
+Hardware-free camera backends
+Drop-in replacements for Picamera2 used to benchmark the streaming stack
+"""
+import io
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+
+class FrameSource:
+    """
+    Base class implementing the subset of the Picamera2 API CameraStreamer uses
+
+    Subclasses provide _next_array(); capture_array() paces calls to the
+    configured frame rate the way a real sensor would.
+    """
+
+    # Seconds CameraStreamer waits after start() before capturing
+    warmup_time = 0.0
+
+    def __init__(self, size=(640, 480), fps=30):
+        """
+        Args:
+            size: (width, height) of captured frames
+            fps: sensor frame rate, None or 0 to capture as fast as possible
+        """
+        self.size = tuple(size)
+        self.fps = fps
+        self.rotate = 0
+        self.started = False
+        self.next_capture = 0.0
+        self.lock = threading.Lock()
+
+    def create_preview_configuration(self, main=None, transform=None):
+        return {'main': main or {}, 'transform': transform}
+
+    def configure(self, config):
+        size = (config.get('main') or {}).get('size')
+        if size:
+            self.size = tuple(size)
+
+    def start(self):
+        self.started = True
+        self.next_capture = time.monotonic()
+
+    def capture_array(self):
+        if not self.started:
+            raise RuntimeError(f"{type(self).__name__} is not started")
+        if self.fps:
+            # Block until the next sensor frame is due
+            with self.lock:
+                now = time.monotonic()
+                delay = self.next_capture - now
+                self.next_capture = max(self.next_capture, now) + 1.0 / self.fps
+            if delay > 0:
+                time.sleep(delay)
+        return self._next_array()
+
+    def _next_array(self):
+        raise NotImplementedError
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.started = False
+
+
+class SyntheticCamera(FrameSource):
+    """Procedural test pattern: scrolling colour gradient with a moving block"""
+
+    def __init__(self, size=(640, 480), fps=30):
+        super().__init__(size, fps)
+        self.count = 0
+        self.base = None
+
+    def configure(self, config):
+        super().configure(config)
+        self.base = None
+
+    def _next_array(self):
+        width, height = self.size
+        if self.base is None:
+            x = np.linspace(0, 255, width, dtype=np.float32)
+            y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+            self.base = np.empty((height, width, 3), dtype=np.uint8)
+            self.base[..., 0] = x
+            self.base[..., 1] = y
+            self.base[..., 2] = (x + y) / 2
+
+        self.count += 1
+        frame = np.roll(self.base, self.count * 8, axis=1)
+        block = max(8, height // 8)
+        top = (self.count * 3) % max(1, height - block)
+        left = (self.count * 5) % max(1, width - block)
+        frame[top:top + block, left:left + block] = 255
+        return frame
+
+
+class ReplayCamera(FrameSource):
+    """
+    Replays recorded frames in a loop
+
+    The source is either a directory of image files (played in name order)
+    or an MJPEG file, raw or as saved from /video_feed.
+    """
+
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    def __init__(self, path, size=None, fps=30):
+        """
+        Args:
+            path: directory of images or MJPEG file
+            size: (width, height) to resize frames to, None to keep them as is
+            fps: replay frame rate
+        """
+        if Image is None:
+            raise RuntimeError("Pillow (PIL) is required for the replay camera")
+        super().__init__(size or (0, 0), fps)
+        self.resize = size is not None
+        self.frames = self._load(path)
+        if not self.frames:
+            raise RuntimeError(f"No frames found in {path}")
+        self.index = 0
+
+    def configure(self, config):
+        size = (config.get('main') or {}).get('size')
+        if size:
+            self.size = tuple(size)
+            self.resize = True
+
+    def _load(self, path):
+        """Read the encoded frames into memory"""
+        if os.path.isdir(path):
+            frames = []
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(self.IMAGE_EXTENSIONS):
+                    with open(os.path.join(path, name), 'rb') as f:
+                        frames.append(f.read())
+            return frames
+        with open(path, 'rb') as f:
+            return split_mjpeg(f.read())
+
+    def _next_array(self):
+        data = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+        img = Image.open(io.BytesIO(data)).convert('RGB')
+        if self.resize and img.size != self.size:
+            img = img.resize(self.size)
+        return np.asarray(img)
+
+
+def split_mjpeg(data):
+    """Split an MJPEG byte stream into individual JPEG images"""
+    frames = []
+    start = data.find(b'\xff\xd8')
+    while start != -1:
+        end = data.find(b'\xff\xd9', start + 2)
+        if end == -1:
+            break
+        frames.append(data[start:end + 2])
+        start = data.find(b'\xff\xd8', end + 2)
+    return frames
@@ -0,0 +1,62 @@
+"""
+Rolling latency percentiles
+"""
+import collections
+import math
+import threading
+
+
+class LatencyWindow:
+    """
+    Keeps the most recent `size` samples and reports their percentiles
+
+    Samples are appended in O(1); sorting only happens when stats are read,
+    which is rare compared to recording.
+    """
+
+    def __init__(self, size=256):
+        """
+        Args:
+            size: number of most recent samples the percentiles cover
+        """
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, fraction):
+        """Nearest-rank percentile in seconds, None without samples"""
+        with self.lock:
+            ordered = sorted(self.samples)
+        return _nearest_rank(ordered, fraction)
+
+    def stats(self):
+        """Count and p50/p95/p99/max in milliseconds"""
+        with self.lock:
+            samples = list(self.samples)
+            count = self.count
+        stats = summarize(samples)
+        stats['count'] = count
+        return stats
+
+
+def summarize(samples):
+    """Count and p50/p95/p99/max in milliseconds of samples in seconds"""
+    ordered = sorted(samples)
+    stats = {'count': len(ordered)}
+    if ordered:
+        for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            stats[f'{name}_ms'] = round(_nearest_rank(ordered, fraction) * 1000, 2)
+        stats['max_ms'] = round(ordered[-1] * 1000, 2)
+    return stats
+
+
+def _nearest_rank(ordered, fraction):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
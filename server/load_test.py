@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test
+Runs the server on the synthetic camera and simulated Motor HAT, then
+drives it with MJPEG viewers and WebSocket drivers and reports JSON
+
+Example:
+    python3 load_test.py --viewers 10 --slow-viewers 2 --drivers 2 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+from control_session import BINARY_SUBPROTOCOL, encode_command
+from frame_broadcaster import WS_HEADER
+from latency_stats import summarize
+
+
+class ServerProcess:
+    """
+    The server under test, in its own process
+
+    Running it separately keeps the clients' CPU out of the measurement;
+    CPU time and resident memory are read from /proc (Linux only).
+    """
+
+    def __init__(self, config, port):
+        self.config = config
+        self.port = port
+        self.process = None
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.max_rss = 0
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', str(self.port),
+             '--config', json.dumps(self.config)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    async def wait_ready(self, base_url, timeout=30.0):
+        """Poll /startup until the app has initialised its hardware"""
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {self.process.returncode}")
+                try:
+                    response = await client.get(f'{base_url}/startup')
+                    if response.status_code == 200:
+                        return response.json()
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+        raise RuntimeError("Server did not start in time")
+
+    def cpu_seconds(self):
+        """User + system CPU time of the server process"""
+        with open(f'/proc/{self.process.pid}/stat') as f:
+            # Fields after the parenthesised command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+
+    def sample_memory(self):
+        with open(f'/proc/{self.process.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    self.max_rss = max(self.max_rss, int(line.split()[1]) * 1024)
+                    return
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class Viewer:
+    """
+    MJPEG client
+
+    A slow viewer either reads its socket at a limited byte rate (a slow
+    link) or sleeps after every frame (a slow renderer), or both.
+    """
+
+    def __init__(self, base_url, profile=None, delay=0.0, bandwidth=0):
+        self.url = f'{base_url}/video_feed' + (f'?profile={profile}' if profile else '')
+        self.delay = delay
+        self.bandwidth = bandwidth
+        self.measuring = False
+        self.frames = 0
+        self.ages = []
+        self.error = None
+
+    def _received(self, timestamp):
+        if self.measuring:
+            self.frames += 1
+            if timestamp is not None:
+                self.ages.append(time.time() - timestamp)
+
+    async def run(self, client):
+        buffer = bytearray()
+        try:
+            async with client.stream('GET', self.url) as response:
+                async for chunk in response.aiter_raw():
+                    buffer += chunk
+                    if self.bandwidth:
+                        await asyncio.sleep(len(chunk) / self.bandwidth)
+                    while True:
+                        part = _take_part(buffer)
+                        if part is None:
+                            break
+                        timestamp = part.get('x-timestamp')
+                        self._received(float(timestamp) if timestamp is not None else None)
+                        if self.delay:
+                            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+
+
+class WebSocketViewer(Viewer):
+    """/ws/video client; acks each frame once it is done with it"""
+
+    def __init__(self, base_url, profile=None, delay=0.0, bandwidth=0):
+        super().__init__(base_url, profile, delay, bandwidth)
+        self.url = (base_url.replace('http://', 'ws://', 1) + '/ws/video'
+                    + (f'?profile={profile}' if profile else ''))
+
+    async def run(self, client=None):
+        try:
+            async with websockets.connect(self.url, max_size=None) as ws:
+                async for message in ws:
+                    number, timestamp, _ = WS_HEADER.unpack_from(message)
+                    self._received(timestamp)
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    await ws.send(str(number))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+
+
+class Driver:
+    """
+    Control client sending a smoothly changing joystick position
+
+    Command round trip is measured from send to the server's ack, which is
+    only sent once the command reached the (simulated) motors; the ack
+    also carries the server-side receive-to-apply latency.
+    """
+
+    def __init__(self, ws_url, rate, binary=True):
+        self.url = ws_url
+        self.rate = rate
+        self.binary = binary
+        self.measuring = False
+        self.sent = {}
+        self.seq = 0
+        self.commands = 0
+        self.acks = 0
+        self.round_trips = []
+        self.apply = []
+        self.error = None
+
+    async def run(self):
+        subprotocols = [BINARY_SUBPROTOCOL] if self.binary else None
+        try:
+            async with websockets.connect(self.url, subprotocols=subprotocols) as ws:
+                receiver = asyncio.create_task(self._receive(ws))
+                try:
+                    await self._send(ws)
+                finally:
+                    receiver.cancel()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+
+    async def _send(self, ws):
+        period = 1.0 / self.rate
+        started = next_send = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - started
+            x = math.sin(elapsed * 2.0) * 0.8
+            y = math.cos(elapsed * 1.3) * 0.8
+            self.seq += 1
+            now = time.monotonic()
+            self.sent[self.seq] = now
+            if self.binary and ws.subprotocol == BINARY_SUBPROTOCOL:
+                await ws.send(encode_command(self.seq, now * 1000, x, y))
+            else:
+                await ws.send(json.dumps({'x': x, 'y': y, 'seq': self.seq, 't': now * 1000}))
+            if self.measuring:
+                self.commands += 1
+            next_send += period
+            await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+
+    async def _receive(self, ws):
+        async for data in ws:
+            message = json.loads(data)
+            if message.get('type') == 'ping':
+                await ws.send(json.dumps({'type': 'pong', 'id': message['id']}))
+            elif message.get('type') == 'ack':
+                sent = self.sent.get(message['seq'])
+                # Acks are latest-wins; forget every command it covers
+                for seq in [s for s in self.sent if s <= message['seq']]:
+                    del self.sent[seq]
+                if sent is not None and self.measuring:
+                    self.acks += 1
+                    self.round_trips.append(time.monotonic() - sent)
+                    self.apply.append(message['apply_ms'] / 1000)
+
+
+def _take_part(buffer):
+    """Remove one complete multipart part from the buffer and return its headers"""
+    end = buffer.find(b'\r\n\r\n')
+    if end == -1:
+        return None
+    headers = {}
+    for line in bytes(buffer[:end]).split(b'\r\n'):
+        name, _, value = line.partition(b':')
+        if value:
+            headers[name.strip().lower().decode()] = value.strip().decode()
+    length = int(headers.get('content-length', 0))
+    total = end + 4 + length + 2
+    if len(buffer) < total:
+        return None
+    del buffer[:total]
+    return headers
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _viewer_report(viewers, seconds):
+    fps = [viewer.frames / seconds for viewer in viewers]
+    ages = [age for viewer in viewers for age in viewer.ages]
+    return {
+        'count': len(viewers),
+        'fps': {
+            'mean': round(sum(fps) / len(fps), 2) if fps else None,
+            'min': round(min(fps), 2) if fps else None,
+            'max': round(max(fps), 2) if fps else None,
+        },
+        'frame_age': summarize(ages),
+        'errors': [viewer.error for viewer in viewers if viewer.error],
+    }
+
+
+async def run_load_test(args):
+    config = {
+        'camera_backend': 'synthetic',
+        'motor_backend': 'sim',
+        'camera_fps': args.fps,
+        'camera_size': list(args.size),
+        'control_rate': args.control_rate,
+        'log_level': 'WARNING',
+    }
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = ServerProcess(config, port)
+    server.start()
+    try:
+        startup = await server.wait_ready(base_url)
+
+        viewer_class = WebSocketViewer if args.video == 'ws' else Viewer
+        viewers = [viewer_class(base_url, args.profile) for _ in range(args.viewers)]
+        slow = [viewer_class(base_url, args.profile, args.slow_delay, args.slow_bandwidth)
+                for _ in range(args.slow_viewers)]
+        drivers = [Driver(f'ws://127.0.0.1:{port}/ws', args.command_rate, args.protocol == 'binary')
+                   for _ in range(args.drivers)]
+        clients = viewers + slow + drivers
+
+        limits = httpx.Limits(max_connections=len(viewers) + len(slow) + 4)
+        timeout = httpx.Timeout(10.0, read=None)
+        # A slow link keeps the receive window small. Left to itself the kernel
+        # grows an unread socket's receive buffer to megabytes of stale video,
+        # which no server can see or drop.
+        slow_options = ([(socket.SOL_SOCKET, socket.SO_RCVBUF, args.slow_rcvbuf)]
+                        if args.slow_rcvbuf else None)
+        slow_transport = httpx.AsyncHTTPTransport(limits=limits, socket_options=slow_options)
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as http, \
+                httpx.AsyncClient(transport=slow_transport, timeout=timeout) as slow_http:
+            tasks = [asyncio.create_task(viewer.run(http)) for viewer in viewers]
+            tasks += [asyncio.create_task(viewer.run(slow_http)) for viewer in slow]
+            tasks += [asyncio.create_task(driver.run()) for driver in drivers]
+
+            # Let the camera start and the clients settle before measuring
+            await asyncio.sleep(args.warmup)
+            for client in clients:
+                client.measuring = True
+            cpu_start = server.cpu_seconds()
+            started = time.monotonic()
+            while time.monotonic() - started < args.duration:
+                server.sample_memory()
+                await asyncio.sleep(0.5)
+            seconds = time.monotonic() - started
+            cpu = server.cpu_seconds() - cpu_start
+            for client in clients:
+                client.measuring = False
+
+            control_stats = (await http.get(f'{base_url}/control/stats')).json()
+            camera_stats = (await http.get(f'{base_url}/camera/stats')).json()
+
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        server.stop()
+
+    return {
+        'parameters': {
+            'viewers': args.viewers,
+            'slow_viewers': args.slow_viewers,
+            'slow_delay': args.slow_delay,
+            'slow_bandwidth': args.slow_bandwidth,
+            'slow_rcvbuf': args.slow_rcvbuf,
+            'profile': args.profile,
+            'video': args.video,
+            'drivers': args.drivers,
+            'command_rate': args.command_rate,
+            'protocol': args.protocol,
+            'camera_fps': args.fps,
+            'size': list(args.size),
+            'control_rate': args.control_rate,
+            'duration': round(seconds, 2),
+        },
+        'startup': startup,
+        'viewers': _viewer_report(viewers, seconds),
+        'slow_viewers': _viewer_report(slow, seconds),
+        'drivers': {
+            'count': len(drivers),
+            'commands': sum(driver.commands for driver in drivers),
+            'acks': sum(driver.acks for driver in drivers),
+            'command_round_trip': summarize([t for d in drivers for t in d.round_trips]),
+            'apply_latency': summarize([t for d in drivers for t in d.apply]),
+            'errors': [driver.error for driver in drivers if driver.error],
+        },
+        'server': {
+            'cpu_percent': round(100 * cpu / seconds, 1),
+            'max_rss_mb': round(server.max_rss / 2**20, 1),
+            'camera_achieved_fps': camera_stats.get('achieved_fps'),
+            'adaptive_quality': camera_stats.get('adaptive'),
+            'control_achieved_hz': control_stats.get('achieved_fps'),
+            'commands_superseded': control_stats.get('superseded'),
+        },
+    }
+
+
+def serve(port, config):
+    """Server side of the load test (run in a subprocess)"""
+    from raspacar_server import create_app, serve as serve_app
+
+    serve_app(create_app(config), host='127.0.0.1', port=port)
+
+
+def _size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--viewers', type=int, default=4, help="MJPEG viewers reading at full speed")
+    parser.add_argument('--slow-viewers', type=int, default=1, help="MJPEG viewers that read slowly")
+    parser.add_argument('--slow-delay', type=float, default=0.2,
+                        help="seconds a slow viewer waits after each frame")
+    parser.add_argument('--slow-bandwidth', type=float, default=0,
+                        help="bytes per second a slow MJPEG viewer reads, 0 for no limit")
+    parser.add_argument('--slow-rcvbuf', type=int, default=16384,
+                        help="SO_RCVBUF of slow MJPEG viewers in bytes, 0 for the kernel default")
+    parser.add_argument('--profile', default=None, help="stream profile the viewers request")
+    parser.add_argument('--video', choices=('mjpeg', 'ws'), default='mjpeg',
+                        help="/video_feed or /ws/video viewers")
+    parser.add_argument('--drivers', type=int, default=1, help="WebSocket control clients")
+    parser.add_argument('--command-rate', type=float, default=50.0,
+                        help="commands per second per driver")
+    parser.add_argument('--protocol', choices=('binary', 'json'), default='binary')
+    parser.add_argument('--fps', type=float, default=30.0, help="camera frame rate")
+    parser.add_argument('--size', type=_size, default=(640, 480), help="camera resolution, WxH")
+    parser.add_argument('--control-rate', type=float, default=50.0, help="motor control loop rate")
+    parser.add_argument('--duration', type=float, default=10.0, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=3.0, help="seconds before measuring")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, json.loads(args.config))
+        return
+
+    report = asyncio.run(run_load_test(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
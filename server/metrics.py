@@ -0,0 +1,238 @@
+"""
+Minimal Prometheus metrics
+Counters, gauges and histograms rendered in the Prometheus text format
+
+Recording a value is a lock and an integer/float update; all formatting
+happens in render(), so the cost is only paid when /metrics is scraped.
+"""
+import bisect
+import threading
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Shared label handling: a metric is a family of children keyed by label values"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        """Get the child metric for a set of label values"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """Yield (suffix, label values, extra label, value) tuples"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, values, extra, value in self._samples():
+            labels = _format_labels(self.labelnames, values, extra)
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class _CounterChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    def _samples(self):
+        for key, child in list(self.children.items()):
+            yield '', key, None, child.value
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from `function` at scrape time"""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed at scrape time"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.children[()].set(value)
+
+    def set_function(self, function):
+        self.children[()].set_function(function)
+
+    def _samples(self):
+        for key, child in list(self.children.items()):
+            try:
+                value = child.get()
+            except Exception:
+                continue
+            if value is not None:
+                yield '', key, None, value
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    kind = 'histogram'
+
+    # Seconds, tuned for frame-time latencies (1 ms to 1 s)
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.075,
+                       0.1, 0.15, 0.25, 0.5, 1.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry=None):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def _samples(self):
+        for key, child in list(self.children.items()):
+            with child.lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', key, ('le', _format_value(float(bound))), cumulative
+            yield '_sum', key, None, total
+            yield '_count', key, None, cumulative
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# Camera pipeline
+CAPTURE_SECONDS = Histogram(
+    'raspacar_capture_seconds', 'Time spent in capture_array()')
+ENCODE_SECONDS = Histogram(
+    'raspacar_encode_seconds', 'JPEG encode time per frame', ['profile'])
+PUBLISH_SECONDS = Histogram(
+    'raspacar_publish_seconds', 'Capture to publish latency per frame', ['profile'])
+SEND_SECONDS = Histogram(
+    'raspacar_send_seconds',
+    'Time to hand one frame to a client socket (until acked by /ws/video clients that ack)', ['transport'])
+FRAMES_PRODUCED = Counter(
+    'raspacar_frames_produced_total', 'Frames encoded and published', ['profile'])
+FRAMES_SENT = Counter(
+    'raspacar_frames_sent_total', 'Frames sent to clients', ['transport'])
+FRAMES_DROPPED = Counter(
+    'raspacar_frames_dropped_total', 'Frames dropped before reaching a client', ['stage'])
+ACTIVE_VIEWERS = Gauge(
+    'raspacar_active_viewers', 'Connected video viewers', ['profile'])
+JPEG_BYTES = Gauge(
+    'raspacar_jpeg_bytes', 'Size of the latest encoded frame', ['profile'])
+
+# Control channel
+COMMAND_SECONDS = Histogram(
+    'raspacar_command_seconds', 'Time to handle one control message')
+TELEMETRY_DROPPED = Counter(
+    'raspacar_telemetry_dropped_total', 'Telemetry snapshots replaced before a slow subscriber sent them')
+ACTUATION_SECONDS = Histogram(
+    'raspacar_actuation_seconds', 'Setpoint received to motor outputs written')
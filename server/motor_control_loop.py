@@ -0,0 +1,149 @@
+"""
+Fixed-rate motor control loop
+Applies the latest joystick setpoint to the motors from a dedicated thread
+"""
+import threading
+import time
+
+from event_log import get_logger
+from frame_pacer import FramePacer
+from metrics import ACTUATION_SECONDS
+
+log = get_logger('motors')
+
+
+class Setpoint:
+    """One joystick command"""
+
+    __slots__ = ('x', 'y', 'received', 'seq', 'on_applied')
+
+    def __init__(self, x, y, received, seq=None, on_applied=None):
+        self.x = x
+        self.y = y
+        self.received = received
+        self.seq = seq
+        self.on_applied = on_applied
+
+
+class SetpointMailbox:
+    """
+    Latest-value-wins mailbox between the event loop and the control thread
+
+    put() and latest() are single reference assignments/reads, which are
+    atomic in CPython, so neither side ever takes a lock or waits.
+    """
+
+    def __init__(self):
+        self.setpoint = Setpoint(0.0, 0.0, time.monotonic())
+        self.received = 0
+
+    def put(self, x, y, seq=None, on_applied=None):
+        """Replace the setpoint (only the newest one is ever applied)"""
+        self.setpoint = Setpoint(x, y, time.monotonic(), seq, on_applied)
+        self.received += 1
+
+    def latest(self):
+        return self.setpoint
+
+
+class MotorControlLoop:
+    """
+    Drives the motor controller at a fixed rate
+
+    WebSocket handlers only drop setpoints into the mailbox. The loop
+    thread wakes `rate` times per second and, if the setpoint changed,
+    applies it with one move() call. I2C traffic is therefore bounded by
+    the loop rate whatever clients send, and a burst of messages collapses
+    to its last value instead of queueing stale commands.
+    """
+
+    def __init__(self, controller, rate=50.0):
+        """
+        Args:
+            controller: AdafruitMotorController (None runs without motors)
+            rate: control loop frequency in Hz
+        """
+        self.controller = controller
+        self.mailbox = SetpointMailbox()
+        self.pacer = FramePacer(rate)
+        self.running = False
+        self.thread = None
+        self.applied = 0
+        self.errors = 0
+        self.last_actuation = None
+
+    def start(self):
+        """Start the control thread"""
+        if self.running:
+            return
+        self.running = True
+        self.pacer.reset()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        log.info('control_loop_started', rate=self.pacer.target_fps)
+
+    def set(self, x, y, seq=None, on_applied=None):
+        """
+        Request a new joystick position (cheap, never blocks)
+
+        Args:
+            x, y: joystick position
+            seq: client sequence number, passed back through on_applied
+            on_applied: called from the control thread as
+                on_applied(setpoint, latency) once the motors are set;
+                never called for setpoints superseded before being applied
+        """
+        self.mailbox.put(x, y, seq, on_applied)
+
+    def stop_motors(self):
+        """Request a stop"""
+        self.mailbox.put(0.0, 0.0)
+
+    def set_rate(self, rate):
+        """Change the loop frequency at runtime"""
+        self.pacer.set_fps(rate)
+
+    def _run(self):
+        applied = None
+        while self.running:
+            self.pacer.wait()
+            setpoint = self.mailbox.latest()
+            if setpoint is applied or self.controller is None:
+                continue
+            try:
+                self.controller.move(setpoint.x, setpoint.y)
+            except Exception as e:
+                # Not applied: the same setpoint is tried again next tick
+                self.errors += 1
+                log.error('motor_error', error=e)
+                continue
+            applied = setpoint
+            self.applied += 1
+            self.last_actuation = time.monotonic() - setpoint.received
+            ACTUATION_SECONDS.observe(self.last_actuation)
+            if setpoint.on_applied is not None:
+                try:
+                    setpoint.on_applied(setpoint, self.last_actuation)
+                except Exception as e:
+                    log.error('motor_error', error=e)
+
+    def shutdown(self):
+        """Stop the loop and the motors"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        if self.controller is not None:
+            self.controller.stop()
+
+    def stats(self):
+        stats = self.pacer.stats()
+        stats['received'] = self.mailbox.received
+        stats['applied'] = self.applied
+        stats['superseded'] = max(0, self.mailbox.received - self.applied)
+        stats['errors'] = self.errors
+        if self.last_actuation is not None:
+            stats['last_actuation_ms'] = round(self.last_actuation * 1000, 2)
+        if self.controller is not None and hasattr(self.controller, 'stats'):
+            stats['motors'] = self.controller.stats()
+        return stats
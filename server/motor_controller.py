@@ -4,8 +4,15 @@ Motor Controller for Adafruit 16-Channel PWM/Servo HAT (PCA9685)
 Supports DC motors via TB6612 or L298N motor drivers
 """
 
+import os
+
+from event_log import get_logger
+from motor_sim import SimulatedPCA9685
+from pca9685_batch import ShadowPCA9685
+
 try:
     from adafruit_servokit import ServoKit
+    from adafruit_motor import servo
     SERVOKIT_AVAILABLE = True
 except ImportError:
     SERVOKIT_AVAILABLE = False
@@ -13,11 +20,27 @@ except ImportError:
 
 try:
     from adafruit_motorkit import MotorKit
-    from adafruit_motor import motor
     MOTORKIT_AVAILABLE = True
 except ImportError:
     MOTORKIT_AVAILABLE = False
 
+log = get_logger('motors')
+
+try:
+    from adafruit_motor import motor
+except ImportError:
+    # Same duty-cycle behaviour, enough to drive the simulated HAT
+    import motor_sim as motor
+
+
+# PCA9685 channels (PWM, IN1, IN2) of each Motor HAT port, as wired by adafruit_motorkit
+MOTOR_HAT_CHANNELS = {
+    1: (8, 9, 10),
+    2: (13, 11, 12),
+    3: (2, 3, 4),
+    4: (7, 5, 6),
+}
+
 
 class AdafruitMotorController:
     """
@@ -26,44 +49,67 @@ class AdafruitMotorController:
     Configuration options:
     1. Using Adafruit Motor HAT/Bonnet (has built-in TB6612 drivers)
     2. Using PCA9685 HAT with external motor drivers
+
+    All PWM writes go through a ShadowPCA9685: unchanged values are never
+    sent, and the channels changed by one move() or stop() are flushed
+    together as a single I2C block write.
     """
     
-    def __init__(self, use_motor_hat=True):
+    def __init__(self, use_motor_hat=True, pca=None):
         """
         Initialize motor controller
         
         Args:
             use_motor_hat: True for Adafruit Motor HAT, False for PCA9685 with external drivers
+            pca: PCA9685 to drive instead of the Motor HAT's own, e.g. a
+                motor_sim.SimulatedPCA9685 (Motor HAT wiring only)
         """
         self.use_motor_hat = use_motor_hat
+        self.simulated = pca is not None
+        self.throttles = {}     # speed last written to each motor
+        self.pending = {}       # speeds staged since the last flush()
+        self.suppressed = 0
         
-        if use_motor_hat:
+        if self.simulated:
+            self._init_motor_hat(pca)
+        elif use_motor_hat:
             self._init_motor_hat()
         else:
             self._init_pwm_hat()
         
-        print("✓ Adafruit Motor Controller initialized")
+        log.info('motors_initialized', hat='simulated' if self.simulated
+                 else 'motor_hat' if use_motor_hat else 'pwm_hat')
     
-    def _init_motor_hat(self):
-        """Initialize Adafruit Motor HAT/Bonnet"""
-        if not MOTORKIT_AVAILABLE:
+    def _init_motor_hat(self, pca=None):
+        """Initialize Adafruit Motor HAT/Bonnet, or its simulation if `pca` is given"""
+        if pca is None and not MOTORKIT_AVAILABLE:
             raise RuntimeError(
                 "MotorKit not available. Install: "
                 "pip3 install adafruit-circuitpython-motorkit"
             )
         
         try:
-            self.kit = MotorKit()
+            if pca is None:
+                self.kit = MotorKit()
+                pca = self.kit._pca
+            else:
+                self.kit = None
+            self.pca = ShadowPCA9685(pca)
+            
+            # Build the DC motors on shadow channels so their writes can be batched
+            dc_motors = {}
+            for port, (pwm, in1, in2) in MOTOR_HAT_CHANNELS.items():
+                self.pca.channels[pwm].duty_cycle = 0xFFFF
+                dc_motors[port] = motor.DCMotor(self.pca.channels[in1], self.pca.channels[in2])
+            self.pca.flush()
             
             # Map motor objects for easy access
             self.motors = {
-                'front_right': self.kit.motor1,
-                'rear_right': self.kit.motor2,
-                'front_left': self.kit.motor3,
-                'rear_left': self.kit.motor4
+                'front_right': dc_motors[1],
+                'rear_right': dc_motors[2],
+                'front_left': dc_motors[3],
+                'rear_left': dc_motors[4]
             }
-            
-            print("✓ Using Adafruit Motor HAT")
         except Exception as e:
             raise RuntimeError(f"Failed to initialize Motor HAT: {e}")
     
@@ -78,6 +124,7 @@ class AdafruitMotorController:
         try:
             # Initialize PCA9685 with 16 channels
             self.kit = ServoKit(channels=16)
+            self.pca = ShadowPCA9685(self.kit._pca)
             
             # Map PWM channels to motors
             # Assumes external motor driver with 2 pins per motor (IN1, IN2 or PWM, DIR)
@@ -88,17 +135,23 @@ class AdafruitMotorController:
                 'rear_right': {'pwm': 6, 'dir': 7}
             }
             
-            print("✓ Using PCA9685 PWM HAT with external drivers")
+            # Continuous servo outputs on shadow channels so their writes can be batched
+            self.servos = {}
+            for channels in self.motor_channels.values():
+                for channel in channels.values():
+                    self.servos[channel] = servo.ContinuousServo(self.pca.channels[channel])
         except Exception as e:
             raise RuntimeError(f"Failed to initialize PCA9685: {e}")
     
-    def set_motor(self, motor_name, speed):
+    def set_motor(self, motor_name, speed, flush=True):
         """
         Set motor speed
         
         Args:
             motor_name: 'front_left', 'front_right', 'rear_left', 'rear_right'
             speed: -100 (full backward) to 100 (full forward)
+            flush: send the change now; pass False to batch several motors
+                and call flush() once
         """
 
         # Motors are wired in reverse
@@ -107,15 +160,40 @@ class AdafruitMotorController:
         # Clamp speed to valid range
         speed = max(-100, min(100, speed))
         
+        # Skip motors already at (or already staged for) this speed
+        if self.pending.get(motor_name, self.throttles.get(motor_name)) == speed:
+            self.suppressed += 1
+            return
+        self.pending[motor_name] = speed
+        
         if self.use_motor_hat:
             self._set_motor_hat(motor_name, speed)
         else:
             self._set_pwm_motor(motor_name, speed)
+        
+        if flush:
+            self.flush()
+    
+    def flush(self):
+        """
+        Write all pending PWM changes in one I2C block write
+
+        Speeds are only remembered once written; if the write fails, the
+        motors involved are forgotten so the next command is sent again.
+        """
+        pending, self.pending = self.pending, {}
+        try:
+            self.pca.flush()
+        except Exception:
+            for motor_name in pending:
+                self.throttles.pop(motor_name, None)
+            raise
+        self.throttles.update(pending)
     
     def _set_motor_hat(self, motor_name, speed):
         """Set motor speed using Motor HAT"""
         if motor_name not in self.motors:
-            print(f"Warning: Unknown motor '{motor_name}'")
+            log.warning('unknown_motor', motor=motor_name)
             return
         
         motor_obj = self.motors[motor_name]
@@ -128,7 +206,7 @@ class AdafruitMotorController:
     def _set_pwm_motor(self, motor_name, speed):
         """Set motor speed using PCA9685 PWM channels"""
         if motor_name not in self.motor_channels:
-            print(f"Warning: Unknown motor '{motor_name}'")
+            log.warning('unknown_motor', motor=motor_name)
             return
         
         channels = self.motor_channels[motor_name]
@@ -138,16 +216,16 @@ class AdafruitMotorController:
         # Determine direction
         if speed > 0:
             # Forward
-            self.kit.continuous_servo[pwm_channel].throttle = speed / 100.0
-            self.kit.continuous_servo[dir_channel].throttle = 1.0
+            self.servos[pwm_channel].throttle = speed / 100.0
+            self.servos[dir_channel].throttle = 1.0
         elif speed < 0:
             # Backward
-            self.kit.continuous_servo[pwm_channel].throttle = abs(speed) / 100.0
-            self.kit.continuous_servo[dir_channel].throttle = -1.0
+            self.servos[pwm_channel].throttle = abs(speed) / 100.0
+            self.servos[dir_channel].throttle = -1.0
         else:
             # Stop
-            self.kit.continuous_servo[pwm_channel].throttle = 0
-            self.kit.continuous_servo[dir_channel].throttle = 0
+            self.servos[pwm_channel].throttle = 0
+            self.servos[dir_channel].throttle = 0
     
     def move(self, x, y):
         """
@@ -169,21 +247,42 @@ class AdafruitMotorController:
         left_speed = max(-100, min(100, left_speed))
         right_speed = max(-100, min(100, right_speed))
         
-        # Apply to motors
-        self.set_motor('front_left', left_speed)
-        self.set_motor('rear_left', left_speed)
-        self.set_motor('front_right', right_speed)
-        self.set_motor('rear_right', right_speed)
+        # Apply to motors in one batched write
+        self.set_motor('front_left', left_speed, flush=False)
+        self.set_motor('rear_left', left_speed, flush=False)
+        self.set_motor('front_right', right_speed, flush=False)
+        self.set_motor('rear_right', right_speed, flush=False)
+        self.flush()
     
     def stop(self):
         """Stop all motors"""
         for motor_name in ['front_left', 'front_right', 'rear_left', 'rear_right']:
-            self.set_motor(motor_name, 0)
+            self.set_motor(motor_name, 0, flush=False)
+        self.flush()
+    
+    def throttle_state(self):
+        """Last commanded speed of each motor, -1.0 to 1.0"""
+        # Stored speeds include the wiring reversal applied in set_motor()
+        return {name: (0.0 - speed) / 100.0 for name, speed in list(self.throttles.items())}
+    
+    def stats(self):
+        """Write suppression and I2C transaction counters"""
+        stats = self.pca.stats()
+        stats['motor_updates_suppressed'] = self.suppressed
+        if self.simulated:
+            stats['bus'] = self.pca.pca.stats()
+        return stats
+    
+    def transactions(self, limit=100):
+        """Recent I2C transactions (simulated HAT only)"""
+        if not self.simulated:
+            return None
+        return self.pca.pca.i2c_device.recent(limit)
     
     def cleanup(self):
         """Cleanup and stop all motors"""
         self.stop()
-        print("✓ Motor controller cleaned up")
+        log.info('motors_cleaned_up')
 
 
 # Example configurations for different setups
@@ -196,7 +295,7 @@ class MotorControllerFactory:
         Create motor controller based on hardware
         
         Args:
-            controller_type: 'motor_hat', 'pwm_hat', or 'auto'
+            controller_type: 'motor_hat', 'pwm_hat', 'sim' or 'auto'
         
         Returns:
             AdafruitMotorController instance
@@ -205,27 +304,19 @@ class MotorControllerFactory:
             # Try Motor HAT first, fall back to PWM HAT
             try:
                 return AdafruitMotorController(use_motor_hat=True)
-            except:
-                print("Motor HAT not found, trying PWM HAT...")
+            except Exception as e:
+                log.warning('motor_hat_not_found', error=e, fallback='pwm_hat')
                 return AdafruitMotorController(use_motor_hat=False)
         elif controller_type == 'motor_hat':
             return AdafruitMotorController(use_motor_hat=True)
         elif controller_type == 'pwm_hat':
             return AdafruitMotorController(use_motor_hat=False)
+        elif controller_type == 'sim':
+            return AdafruitMotorController(pca=SimulatedPCA9685())
         else:
             raise ValueError(f"Unknown controller type: {controller_type}")
 
 
-# Create global motor controller instance
-# Change 'motor_hat' to 'pwm_hat' or 'auto' based on your hardware
-try:
-    motor_controller = MotorControllerFactory.create('motor_hat')
-except Exception as e:
-    print(f"⚠ Motor controller initialization failed: {e}")
-    print("  Running without motor control")
-    motor_controller = None
-
-
 if __name__ == "__main__":
     """Test motor controller"""
     import time
@@ -233,8 +324,11 @@ if __name__ == "__main__":
     print("\nTesting Motor Controller")
     print("=" * 50)
     
-    if motor_controller is None:
-        print("Motor controller not available")
+    # Set RASPACAR_MOTORS to 'pwm_hat', 'sim' or 'auto' based on your hardware
+    try:
+        motor_controller = MotorControllerFactory.create(os.environ.get('RASPACAR_MOTORS', 'motor_hat'))
+    except Exception as e:
+        print(f"Motor controller not available: {e}")
         exit(1)
     
     try:
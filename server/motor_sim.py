@@ -0,0 +1,213 @@
+"""
+Simulated Motor HAT
+A PCA9685 register model behind a fake I2C bus, for running and
+benchmarking motor control without the hardware
+"""
+import collections
+import threading
+import time
+
+from pca9685_batch import CHANNELS, LED0_REGISTER, MODE1_AUTO_INCREMENT, MODE1_REGISTER
+
+# Bits per byte on the wire (8 data + ACK)
+_BITS_PER_BYTE = 9
+
+
+class I2CTransaction:
+    """One recorded bus transfer"""
+
+    __slots__ = ('start', 'duration', 'kind', 'register', 'data')
+
+    def __init__(self, start, duration, kind, register, data):
+        self.start = start
+        self.duration = duration
+        self.kind = kind
+        self.register = register
+        self.data = data
+
+    def describe(self):
+        return {
+            'start': self.start,
+            'duration_us': round(self.duration * 1e6, 1),
+            'kind': self.kind,
+            'register': self.register,
+            'length': len(self.data),
+        }
+
+
+class SimulatedI2CDevice:
+    """
+    I2C device with the adafruit_bus_device interface
+
+    Every transfer takes as long as it would on the wire: address byte plus
+    payload at `bus_speed`, plus a fixed per-transaction overhead for the
+    driver round trip. Transfers hold the bus lock, so concurrent callers
+    serialize like they would on a real bus.
+    """
+
+    def __init__(self, registers, bus_speed=100_000, overhead=100e-6, history=4096,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            registers: bytearray register file of the target chip
+            bus_speed: I2C clock in Hz (100 kHz is the Raspberry Pi default)
+            overhead: fixed seconds per transaction (syscall, start/stop)
+            history: number of transactions kept for inspection
+            clock: monotonic clock in seconds
+            sleep: sleep function used to model transfer time
+        """
+        self.registers = registers
+        self.bus_speed = bus_speed
+        self.overhead = overhead
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.RLock()
+        self.history = collections.deque(maxlen=history)
+        self.transactions = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.started = clock()
+
+    def __enter__(self):
+        self.lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+    def transfer_time(self, length):
+        """Seconds to move `length` bytes plus the address byte"""
+        return self.overhead + (length + 1) * _BITS_PER_BYTE / self.bus_speed
+
+    def _record(self, kind, register, data, length):
+        duration = self.transfer_time(length)
+        with self.lock:
+            start = self.clock()
+            self.sleep(duration)
+            self.history.append(I2CTransaction(start, duration, kind, register, bytes(data)))
+            self.transactions += 1
+            self.bytes += length
+            self.busy_time += duration
+
+    def write(self, buffer, start=0, end=None):
+        """Write register address followed by data"""
+        buffer = bytes(buffer[start:end])
+        register = buffer[0]
+        with self.lock:
+            self._record('write', register, buffer[1:], len(buffer))
+            auto_increment = self.registers[MODE1_REGISTER] & MODE1_AUTO_INCREMENT
+            for offset, value in enumerate(buffer[1:]):
+                # Without auto-increment every byte lands in the same register
+                self.registers[(register + offset) & 0xFF if auto_increment else register] = value
+
+    def write_then_readinto(self, out_buffer, in_buffer, out_start=0, out_end=None,
+                            in_start=0, in_end=None):
+        """Set the register pointer and read back from it"""
+        register = out_buffer[out_start]
+        if in_end is None:
+            in_end = len(in_buffer)
+        length = in_end - in_start
+        with self.lock:
+            data = bytes(self.registers[(register + i) & 0xFF] for i in range(length))
+            self._record('read', register, data, 1 + length)
+            in_buffer[in_start:in_end] = data
+
+    def stats(self):
+        with self.lock:
+            elapsed = max(self.clock() - self.started, 1e-9)
+            return {
+                'bus_speed': self.bus_speed,
+                'transactions': self.transactions,
+                'bytes': self.bytes,
+                'busy_seconds': round(self.busy_time, 6),
+                'bus_utilization': round(self.busy_time / elapsed, 4),
+            }
+
+    def recent(self, limit=100):
+        """The last `limit` transactions, oldest first"""
+        with self.lock:
+            items = list(self.history)[-limit:] if limit else []
+        return [t.describe() for t in items]
+
+
+class SimulatedPCA9685:
+    """
+    PCA9685 register model with the adafruit_pca9685.PCA9685 attributes
+    AdafruitMotorController uses (i2c_device, frequency, mode1_reg)
+    """
+
+    def __init__(self, frequency=1600, **bus_options):
+        """
+        Args:
+            frequency: PWM frequency in Hz (MotorKit uses 1600)
+            bus_options: SimulatedI2CDevice timing options
+        """
+        self.registers = bytearray(256)
+        self.i2c_device = SimulatedI2CDevice(self.registers, **bus_options)
+        self.frequency = frequency
+
+    @property
+    def mode1_reg(self):
+        buffer = bytearray(1)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes([MODE1_REGISTER]), buffer)
+        return buffer[0]
+
+    @mode1_reg.setter
+    def mode1_reg(self, value):
+        with self.i2c_device as i2c:
+            i2c.write(bytes([MODE1_REGISTER, value & 0xFF]))
+
+    def duty_cycle(self, channel):
+        """16-bit duty cycle the chip is currently outputting on a channel"""
+        base = LED0_REGISTER + 4 * channel
+        on = self.registers[base] | self.registers[base + 1] << 8
+        off = self.registers[base + 2] | self.registers[base + 3] << 8
+        if on & 0x1000:
+            return 0xFFFF
+        if off & 0x1000:
+            return 0
+        return ((off - on) & 0x0FFF) << 4
+
+    def outputs(self):
+        return [self.duty_cycle(channel) for channel in range(CHANNELS)]
+
+    def stats(self):
+        return self.i2c_device.stats()
+
+
+class DCMotor:
+    """
+    Stand-in for adafruit_motor.motor.DCMotor (fast decay mode)
+
+    Used when adafruit_motor is not installed, so the simulator drives the
+    same duty cycles as the real library.
+    """
+
+    def __init__(self, positive_pwm, negative_pwm):
+        self._positive = positive_pwm
+        self._negative = negative_pwm
+        self._throttle = None
+
+    @property
+    def throttle(self):
+        return self._throttle
+
+    @throttle.setter
+    def throttle(self, value):
+        if value is not None and not -1.0 <= value <= 1.0:
+            raise ValueError("Throttle must be None or between -1.0 and +1.0")
+        self._throttle = value
+        if value is None:
+            self._positive.duty_cycle = 0
+            self._negative.duty_cycle = 0
+        elif value == 0:
+            self._positive.duty_cycle = 0xFFFF
+            self._negative.duty_cycle = 0xFFFF
+        elif value < 0:
+            self._positive.duty_cycle = 0
+            self._negative.duty_cycle = int(0xFFFF * -value)
+        else:
+            self._positive.duty_cycle = int(0xFFFF * value)
+            self._negative.duty_cycle = 0
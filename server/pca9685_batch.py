@@ -0,0 +1,169 @@
+"""
+Shadow registers and batched writes for the PCA9685 PWM driver
+"""
+import struct
+import threading
+
+# First LED0_ON_L register; each channel has 4 bytes (ON_L, ON_H, OFF_L, OFF_H)
+LED0_REGISTER = 0x06
+MODE1_REGISTER = 0x00
+MODE1_RESTART = 0x80
+MODE1_AUTO_INCREMENT = 0x20
+CHANNELS = 16
+
+_CHANNEL = struct.Struct('<HH')
+
+
+def duty_to_registers(value):
+    """(ON, OFF) register values for a 16-bit duty cycle, as adafruit_pca9685 sets them"""
+    if value == 0xFFFF:
+        return (0x1000, 0)      # fully on
+    if value < 0x0010:
+        return (0, 0x1000)      # fully off
+    return (0, value >> 4)
+
+
+class ShadowChannel:
+    """
+    PWM output with the adafruit PWMChannel interface
+
+    Setting duty_cycle only updates the shadow register; nothing is sent
+    until ShadowPCA9685.flush().
+    """
+
+    def __init__(self, shadow, index):
+        self._shadow = shadow
+        self._index = index
+
+    @property
+    def frequency(self):
+        return self._shadow.frequency
+
+    @property
+    def duty_cycle(self):
+        return self._shadow.duty_cycles[self._index]
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError(f"Out of range: value {value} not 0 <= value <= 65,535")
+        self._shadow.set_duty_cycle(self._index, value)
+
+
+class ShadowPCA9685:
+    """
+    Write-suppressing, batching front end for a PCA9685
+
+    Keeps a shadow copy of every channel's ON/OFF registers. Writes that
+    would not change a register are dropped, and flush() sends all changed
+    channels as auto-increment block writes: one I2C transaction per
+    contiguous run of channels instead of one per duty-cycle assignment.
+    """
+
+    def __init__(self, pca):
+        """
+        Args:
+            pca: adafruit_pca9685.PCA9685 (or anything with i2c_device,
+                frequency and mode1_reg)
+        """
+        self.pca = pca
+        self.frequency = pca.frequency
+        self.registers = [None] * CHANNELS     # (ON, OFF) as last written, None = unknown
+        self.duty_cycles = [0] * CHANNELS
+        self.pending = {}                      # channel -> (ON, OFF) staged, not yet written
+        self.lock = threading.Lock()
+        self.channels = [ShadowChannel(self, i) for i in range(CHANNELS)]
+        self.requested = 0
+        self.suppressed = 0
+        self.channel_writes = 0
+        self.transactions = 0
+
+        # Block writes rely on register auto-increment
+        mode = pca.mode1_reg
+        if not mode & MODE1_AUTO_INCREMENT:
+            pca.mode1_reg = (mode & ~MODE1_RESTART) | MODE1_AUTO_INCREMENT
+
+    def set_duty_cycle(self, index, value):
+        """Stage a duty cycle for one channel"""
+        registers = duty_to_registers(value)
+        with self.lock:
+            self.requested += 1
+            self.duty_cycles[index] = value
+            if self.registers[index] == registers:
+                # Back to what the chip already has: cancel any staged change
+                self.pending.pop(index, None)
+                self.suppressed += 1
+                return
+            self.pending[index] = registers
+
+    def flush(self):
+        """
+        Send every staged change; returns the number of I2C transactions used
+
+        The shadow only takes a value once its write succeeded. If a write
+        fails, every channel it and any later run covered becomes unknown:
+        staged values are discarded, so the next assignment is sent again
+        whatever it is, and channels that were only bridged stay staged at
+        their old value. The error is re-raised.
+        """
+        with self.lock:
+            if not self.pending:
+                return 0
+            runs = self._runs(sorted(self.pending))
+            written = 0
+            try:
+                with self.pca.i2c_device as i2c:
+                    for first, last in runs:
+                        buffer = bytearray(1 + 4 * (last - first + 1))
+                        buffer[0] = LED0_REGISTER + 4 * first
+                        for channel in range(first, last + 1):
+                            registers = self.pending.get(channel, self.registers[channel])
+                            _CHANNEL.pack_into(buffer, 1 + 4 * (channel - first), *registers)
+                        i2c.write(buffer)
+                        for channel in range(first, last + 1):
+                            if channel in self.pending:
+                                self.registers[channel] = self.pending.pop(channel)
+                        written += 1
+                        self.channel_writes += last - first + 1
+                        self.transactions += 1
+            except Exception:
+                for first, last in runs[written:]:
+                    for channel in range(first, last + 1):
+                        if channel in self.pending:
+                            del self.pending[channel]
+                        elif self.registers[channel] is not None:
+                            # Only bridged a gap; nothing will stage it again
+                            self.pending[channel] = self.registers[channel]
+                        self.registers[channel] = None
+                raise
+            return len(runs)
+
+    def _runs(self, dirty):
+        """
+        Group staged channels into contiguous register ranges
+
+        Clean channels with a known value may be rewritten to bridge a gap
+        between staged ones; channels with an unknown value split a run.
+        """
+        runs = []
+        first = last = dirty[0]
+        for channel in dirty[1:]:
+            gap = range(last + 1, channel)
+            if all(self.registers[c] is not None for c in gap):
+                last = channel
+            else:
+                runs.append((first, last))
+                first = last = channel
+        runs.append((first, last))
+        return runs
+
+    def stats(self):
+        with self.lock:
+            return {
+                'duty_writes_requested': self.requested,
+                'duty_writes_suppressed': self.suppressed,
+                'channel_writes': self.channel_writes,
+                'i2c_transactions': self.transactions,
+                # Previously every requested duty write was its own transaction
+                'i2c_transactions_saved': self.requested - self.transactions,
+            }
@@ -4,113 +4,767 @@ Raspberry Pi Car WiFi Server
 Creates WiFi AP and serves video stream + control WebSocket
 """
 from html_template import HTML_PAGE
-from motor_controller import motor_controller
-from cam_streamer import camera_streamer
+from motor_controller import MotorControllerFactory
+from cam_streamer import CameraStreamer
+from camera_lifecycle import CameraLifecycle
+from frame_broadcaster import BOUNDARY
+from frame_recorder import FrameRingBuffer, write_avi, write_mjpeg
+from scene_detector import SceneChangeDetector
+from send_buffers import DEFAULT_SEND_BUFFER, bounded_http_protocol
+import event_log
+from event_log import get_logger, setup_logging
+from metrics import COMMAND_SECONDS, FRAMES_SENT, REGISTRY, SEND_SECONDS
+from motor_control_loop import MotorControlLoop
+from static_assets import StaticAssets
+from telemetry import TelemetryBroadcaster
+from control_session import BINARY_SUBPROTOCOL, ControlSession, decode_command
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+
+from contextlib import asynccontextmanager
 
 import json
 import asyncio
-import threading
+import functools
+import os
+import time
+import uuid
+
+
+log = get_logger('control')
+log_video = get_logger('video')
+
+
+DEFAULT_CONFIG = {
+    # Camera: 'picamera2', 'synthetic' or 'replay' (playing camera_source)
+    'camera_backend': 'picamera2',
+    'camera_source': None,
+    'camera_size': (640, 480),
+    'camera_fps': 30,
+    'encode_workers': 3,
+    'camera_linger': CameraLifecycle.DEFAULT_LINGER,
+    'dvr': True,                    # keep the last frames of the driver view in memory
+    'dvr_seconds': 30,              # DVR length the ring is sized for
+    'scene_detection': True,        # skip encodes of an unchanged scene
+    'send_buffer': DEFAULT_SEND_BUFFER,  # per-connection SO_SNDBUF, None = kernel default
+    # Motors: 'motor_hat', 'pwm_hat', 'auto', 'sim' or None for no motors
+    'motor_backend': 'motor_hat',
+    'control_rate': 50,
+    'input_rate': None,             # joystick sampling rate, None = control_rate
+    'input_deadband': 0.02,
+    'heartbeat_interval': 1.0,
+    'heartbeat_timeout': 5.0,
+    # Frames in flight on /ws/video for clients that ack them
+    'video_ack_window': 3,
+    'command_max_age': 0.5,
+    'telemetry_rate': 5.0,
+    'log_level': 'INFO',
+    # Seconds a request waits for hardware still initialising before a 503
+    'init_timeout': 10.0,
+}
+
+# Environment overrides, applied over the defaults
+ENV_CONFIG = {
+    'RASPACAR_CAMERA': 'camera_backend',
+    'RASPACAR_CAMERA_SOURCE': 'camera_source',
+    'RASPACAR_MOTORS': 'motor_backend',
+    'RASPACAR_LOG_LEVEL': 'log_level',
+}
+
+
+def load_config(config=None):
+    """Defaults, then RASPACAR_* environment variables, then `config`"""
+    merged = dict(DEFAULT_CONFIG)
+    for variable, key in ENV_CONFIG.items():
+        if variable in os.environ:
+            merged[key] = os.environ[variable]
+    merged.update(config or {})
+    return merged
+
+
+def create_app(config=None):
+    """
+    Create and configure the FastAPI app
+
+    Nothing touches the hardware here. When the app starts (lifespan) the
+    camera and the motor HAT are opened concurrently in worker threads in
+    the background, and the server accepts connections straight away.
+    Handlers that need the camera wait up to `init_timeout` seconds for it
+    and answer 503 after that; motor commands are ignored until the HAT is
+    ready. A component that fails is logged and the server runs without it
+    (the camera is retried by its first viewer). GET /startup reports what
+    happened.
+    """
+    config = load_config(config)
+
+    # Logging goes through a background writer; levels can change at runtime
+    setup_logging(config['log_level'])
+
+    camera_streamer = CameraStreamer(
+        fps=config['camera_fps'],
+        encode_workers=config['encode_workers'],
+        backend=config['camera_backend'],
+        size=config['camera_size'],
+        source_path=config['camera_source'],
+        recorder=(FrameRingBuffer.for_duration(config['dvr_seconds'], config['camera_fps'],
+                                               config['camera_size'])
+                  if config['dvr'] else None),
+        scene_detector=SceneChangeDetector() if config['scene_detection'] else None,
+        open_camera=False,
+    )
+    motor_controller = None
+    startup = {}
+    init_tasks = {}
+
+    # Starts the camera for the first viewer, stops it after the linger period
+    camera_lifecycle = CameraLifecycle(camera_streamer, linger=config['camera_linger'])
+
+    # Applies the latest joystick setpoint to the motors at a fixed rate; the
+    # controller is attached once the motor HAT is initialised
+    control_rate = config['control_rate']
+    control_loop = MotorControlLoop(None, rate=control_rate)
+
+    async def init_component(name, function):
+        """
+        Run a blocking initialiser in a thread and record how it went
+
+        A thread cannot be cancelled, so one that runs past init_timeout is
+        reported and then still awaited: the component is never opened a
+        second time while its first initialisation is in progress.
+        """
+        started = time.perf_counter()
+        startup[name] = {'ok': None}
+        future = asyncio.ensure_future(asyncio.to_thread(function))
+        try:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), config['init_timeout'])
+            except asyncio.TimeoutError:
+                log.warning('startup_slow', component=name, timeout=config['init_timeout'])
+                result = await future
+            startup[name] = {'ok': True}
+        except Exception as e:
+            result = None
+            startup[name] = {'ok': False, 'error': str(e) or type(e).__name__}
+        startup[name]['seconds'] = round(time.perf_counter() - started, 3)
+        report = log.info if startup[name]['ok'] else log.warning
+        report('startup', component=name, **startup[name])
+        return result
+
+    def create_motors():
+        backend = config['motor_backend']
+        return MotorControllerFactory.create(backend) if backend else None
+
+    async def init_motors():
+        nonlocal motor_controller
+        controller = await init_component('motors', create_motors)
+        if controller is not None:
+            # Start stopped: setpoints sent before the HAT was ready are stale
+            control_loop.stop_motors()
+            motor_controller = controller
+            control_loop.controller = controller
+
+    async def init_hardware(started):
+        await asyncio.gather(*init_tasks.values())
+        startup['total_seconds'] = round(time.perf_counter() - started, 3)
+
+    async def wait_ready(name):
+        """Wait up to init_timeout for a component still initialising; False if it is not ready"""
+        task = init_tasks.get(name)
+        if task is None or task.done():
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(task), config['init_timeout'])
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def require_camera():
+        if not await wait_ready('camera'):
+            raise HTTPException(status_code=503, detail="Camera is still initialising")
+
+    async def acquire_camera():
+        """Start the camera for one more user; False (and logged) if it cannot start"""
+        try:
+            await camera_lifecycle.acquire()
+            return True
+        except Exception as e:
+            log.warning('camera_start_failed', error=str(e) or type(e).__name__)
+            return False
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Initialise in the background so the server accepts connections now
+        started = time.perf_counter()
+        init_tasks['camera'] = asyncio.create_task(
+            init_component('camera', camera_streamer.init_camera))
+        init_tasks['motors'] = asyncio.create_task(init_motors())
+        hardware = asyncio.create_task(init_hardware(started))
+        # The first viewer's camera start waits for this instead of opening it again
+        camera_lifecycle.ready = init_tasks['camera']
+        control_loop.start()
+        try:
+            yield
+        finally:
+            # Initialiser threads cannot be cancelled; let them finish first
+            await asyncio.wait([hardware], timeout=config['init_timeout'])
+            await camera_lifecycle.shutdown()
+            control_loop.shutdown()
+            await asyncio.to_thread(camera_streamer.close)
+            if motor_controller is not None:
+                motor_controller.cleanup()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.config = config
+    app.state.camera_streamer = camera_streamer
+    app.state.control_loop = control_loop
+
+    # Control connection heartbeats: ping interval, and silence after which
+    # a client is considered gone and the motors are stopped
+    heartbeat_interval = config['heartbeat_interval']
+    heartbeat_timeout = config['heartbeat_timeout']
+    # Timestamped commands delivered this much later than usual are dropped
+    command_max_age = config['command_max_age']
 
+    # Advertised to clients: how often to sample the joystick (sending faster
+    # than the control loop only supersedes setpoints) and the smallest
+    # change worth sending
+    input_config = {
+        'type': 'config',
+        'input_rate': config['input_rate'] or control_rate,
+        'deadband': config['input_deadband'],
+        'heartbeat_interval': heartbeat_interval,
+    }
+    control_sessions = {}
 
-# Track active clients
-active_video_clients = 0
-active_video_clients_lock = threading.Lock()
+    # Frame numbers restart with the process, so ETags carry a per-run token
+    etag_prefix = uuid.uuid4().hex[:8]
 
-def create_app(config = {}):
-    """Create and configure the FastAPI app"""
-    app = FastAPI()
+    # Per-transport metrics children, resolved once
+    send_seconds = {t: SEND_SECONDS.labels(transport=t) for t in ('mjpeg', 'websocket')}
+    frames_sent = {t: FRAMES_SENT.labels(transport=t) for t in ('mjpeg', 'websocket')}
+
+    def telemetry_snapshot():
+        """Motor, camera and connection state; cheap reads only, runs on the event loop"""
+        pacer = camera_streamer.pacer.stats()
+        control = control_loop.pacer.stats()
+        return {
+            'motors': motor_controller.throttle_state() if motor_controller is not None else None,
+            'control': {
+                'achieved_hz': control['achieved_fps'],
+                'applied': control_loop.applied,
+                'last_actuation_ms': (round(control_loop.last_actuation * 1000, 2)
+                                      if control_loop.last_actuation is not None else None),
+            },
+            'camera': {
+                'running': camera_streamer.running,
+                'target_fps': pacer['target_fps'],
+                'achieved_fps': pacer['achieved_fps'],
+                'frame_number': camera_streamer.broadcaster.number,
+                'quality': {name: stream.adaptive.settings()[0]
+                            for name, stream in camera_streamer.streams.items()},
+            },
+            'connections': {
+                'control': len(control_sessions),
+                'viewers': {name: len(stream.broadcaster.slots)
+                            for name, stream in camera_streamer.streams.items()},
+                'telemetry': len(telemetry.slots),
+            },
+            'link': {session.id: session.rtt.stats() for session in control_sessions.values()},
+        }
+
+    # One snapshot and one JSON encode per tick, however many subscribers
+    telemetry = TelemetryBroadcaster(telemetry_snapshot, rate=config['telemetry_rate'])
     
+    # Page, script and styles are hashed and compressed once, here
+    static_assets = StaticAssets(HTML_PAGE)
+
+    def asset_response(asset, request):
+        """Precompressed asset body, or 304 if the client's copy is current"""
+        encoding, body, etag = asset.select(request.headers.get('accept-encoding'))
+        headers = {'ETag': etag, 'Cache-Control': asset.cache_control, 'Vary': 'Accept-Encoding'}
+        if asset.matches(request.headers.get('if-none-match')):
+            return Response(status_code=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(body, media_type=asset.content_type, headers=headers)
+
     @app.get("/")
-    async def root():
+    async def root(request: Request):
         """Serve web control interface"""
-        return HTMLResponse(HTML_PAGE)
+        return asset_response(static_assets.page, request)
+
+    @app.get("/static/{name}")
+    async def static_file(name: str, request: Request):
+        """Content-hashed page assets, cacheable forever"""
+        asset = static_assets.get(f'/static/{name}')
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Unknown asset")
+        return asset_response(asset, request)
     
     @app.get('/video_feed')
-    async def video_feed():
-        """MJPEG video stream endpoint"""
-        async def generate():
-            global active_video_clients
-            # Increment client count and start camera if first client
-            with active_video_clients_lock:
-                active_video_clients += 1
-                if active_video_clients == 1:
-                    print("📹 Starting camera (first client connected)")
-                    camera_streamer.start()
+    async def video_feed(profile: str = None):
+        """MJPEG video stream endpoint (optionally for a named stream profile)"""
+        stream = camera_streamer.get_stream(profile)
+        if stream is None:
+            raise HTTPException(status_code=404, detail=f"Unknown stream profile: {profile}")
+        await require_camera()
+        # Start the camera before any headers go out, so a failure is a 503;
+        # the stream below releases it
+        if not await acquire_camera():
+            raise HTTPException(status_code=503, detail="Camera could not start")
 
+        async def generate():
+            # Report how fast this viewer drains frames to the quality controller
+            viewer = stream.adaptive.add_viewer()
+            # One-frame send slot: a frame not yet sent is replaced by a newer one
+            slot = stream.broadcaster.subscribe()
             try:
+                frame = None
                 while True:
-                    frame = camera_streamer.get_frame()
-                    if frame:
-                        yield (b'--frame\r\n'
-                            b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                    await asyncio.sleep(0.033)  # ~30 FPS
+                    # An empty chunk sends nothing but returns only once the
+                    # previous frame has left the transport (see send_buffers),
+                    # so the frame taken next is the newest one
+                    yield b''
+                    if frame is not None:
+                        elapsed = time.monotonic() - sent
+                        send_seconds['mjpeg'].observe(elapsed)
+                        frames_sent['mjpeg'].inc()
+                        stream.adaptive.record(viewer, frame.number, elapsed,
+                                               age=time.time() - frame.timestamp)
+                    frame = await slot.get()
+                    sent = time.monotonic()
+                    # The same prebuilt part for every viewer (uvicorn copies it
+                    # into a chunk per viewer; see Frame)
+                    yield frame.part
             finally:
-                # Decrement client count and stop camera if no clients left
-                with active_video_clients_lock:
-                    active_video_clients -= 1
-                    if active_video_clients == 0:
-                        print("📹 Stopping camera (no clients connected)")
-                        camera_streamer.stop()
-
-        return StreamingResponse(generate(), media_type="multipart/x-mixed-replace; boundary=frame")
+                stream.broadcaster.unsubscribe(slot)
+                stream.adaptive.remove_viewer(viewer)
+                camera_lifecycle.release()
+
+        return StreamingResponse(generate(), media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}")
     
+    @app.get('/snapshot')
+    async def snapshot(request: Request, profile: str = None,
+                       wait: float = Query(0, ge=0, le=5), max_age: float = Query(2.0, gt=0)):
+        """
+        Latest JPEG from memory, without re-encoding
+
+        The ETag is the frame number, so If-None-Match answers 304 until a
+        new frame arrives. With `wait`, waits up to that many seconds for
+        the next frame. A missing or stale (older than `max_age` seconds)
+        frame starts the camera through the lifecycle, whose linger keeps it
+        warm for periodic snapshots. If the camera cannot start, the cached
+        frame is served, or 503 when there is none.
+        """
+        stream = camera_streamer.get_stream(profile)
+        if stream is None:
+            raise HTTPException(status_code=404, detail=f"Unknown stream profile: {profile}")
+        broadcaster = stream.broadcaster
+        if broadcaster.latest is None:
+            await require_camera()
+
+        frame = broadcaster.latest
+        stale = frame is None or time.time() - frame.timestamp > max_age
+        if stale or wait:
+            after = frame.number if frame is not None else 0
+            # A cold camera needs its warm-up before the first frame
+            timeout = max(wait, 5.0) if stale else wait
+            if await acquire_camera():
+                try:
+                    frame = await asyncio.wait_for(broadcaster.wait_frame(after), timeout)
+                except asyncio.TimeoutError:
+                    frame = broadcaster.latest
+                finally:
+                    camera_lifecycle.release()
+            else:
+                # Serve the cached frame, if any, when the camera cannot start
+                frame = broadcaster.latest
+        if frame is None:
+            raise HTTPException(status_code=503, detail="No camera frame available")
+
+        etag = f'"{etag_prefix}-{stream.profile.name}-{frame.number}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache',
+                   'X-Frame-Timestamp': f"{frame.timestamp:.3f}"}
+        if etag in request.headers.get('if-none-match', ''):
+            return Response(status_code=304, headers=headers)
+        return Response(bytes(frame.data), media_type='image/jpeg', headers=headers)
+
+    @app.get('/metrics')
+    async def metrics():
+        """Prometheus metrics (text exposition format)"""
+        return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+    @app.get('/control/stats')
+    async def control_stats():
+        """Motor control loop rate and setpoint counters"""
+        return control_loop.stats()
+
+    @app.get('/startup')
+    async def startup_report():
+        """Initialisation time and outcome of each hardware component"""
+        return startup
+
+    @app.get('/telemetry')
+    async def telemetry_stats():
+        """Telemetry rate, subscribers and per-tick serialization cost"""
+        return telemetry.stats()
+
+    @app.get('/logging')
+    async def logging_state():
+        """Log levels, per-event sampling limits and suppressed counts"""
+        return event_log.state()
+
+    @app.post('/logging')
+    async def logging_configure(request: Request):
+        """
+        Change log levels and sampling, e.g.
+        {"levels": {"control": "DEBUG"}, "sampling": {"command": 20}}
+        """
+        try:
+            body = await request.json()
+            event_log.configure(body.get('levels'), body.get('sampling'))
+        except (ValueError, TypeError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid logging settings: {e}")
+        return event_log.state()
+
+    @app.get('/control/connections')
+    async def control_connections():
+        """Round-trip and command apply latency of each control connection"""
+        return [session.stats() for session in control_sessions.values()]
+
+    @app.get('/control/bus')
+    async def control_bus(limit: int = 100):
+        """Recent I2C transactions of the simulated Motor HAT"""
+        transactions = motor_controller.transactions(limit) if motor_controller is not None else None
+        if transactions is None:
+            raise HTTPException(status_code=404, detail="Motor bus is only recorded with the simulated HAT")
+        return {'stats': motor_controller.stats()['bus'], 'transactions': transactions}
+
+    @app.get('/camera/stats')
+    async def camera_stats():
+        """Capture pacing statistics (target/achieved FPS, jitter)"""
+        return camera_streamer.stats()
+
+    @app.post('/camera/fps')
+    async def camera_fps(fps: float = Query(..., gt=0, le=120)):
+        """Set the capture target FPS"""
+        camera_streamer.set_target_fps(fps)
+        return camera_streamer.stats()
+
+    @app.get('/camera/scene')
+    async def camera_scene():
+        """Static-scene detection settings and skip counters"""
+        if camera_streamer.scene_detector is None:
+            raise HTTPException(status_code=404, detail="Scene detection is disabled")
+        return camera_streamer.scene_detector.stats()
+
+    @app.post('/camera/scene')
+    async def camera_scene_configure(threshold: float = Query(None, ge=0),
+                                     refresh_interval: float = Query(None, gt=0)):
+        """Change the scene-change threshold and forced refresh interval"""
+        if camera_streamer.scene_detector is None:
+            raise HTTPException(status_code=404, detail="Scene detection is disabled")
+        camera_streamer.scene_detector.configure(threshold, refresh_interval)
+        return camera_streamer.scene_detector.stats()
+
+    @app.get('/camera/lifecycle')
+    async def camera_lifecycle_state():
+        """Camera users and linger state"""
+        return camera_lifecycle.state()
+
+    @app.get('/camera/quality')
+    async def camera_quality():
+        """Current adaptive JPEG quality and scale decisions per profile"""
+        return {name: stream.adaptive.state()
+                for name, stream in camera_streamer.streams.items()}
+
+    @app.get('/camera/profiles')
+    async def camera_profiles():
+        """Available stream profiles for /video_feed?profile=..."""
+        return [stream.profile.describe() for stream in camera_streamer.streams.values()]
+
+    @app.get('/dvr')
+    async def dvr_status():
+        """What the in-memory DVR currently holds"""
+        if camera_streamer.recorder is None:
+            raise HTTPException(status_code=404, detail="DVR is disabled")
+        return camera_streamer.recorder.stats()
+
+    @app.get('/dvr/export')
+    async def dvr_export(seconds: float = Query(30, gt=0), start: float = None,
+                         end: float = None, format: str = 'avi'):
+        """
+        Export recorded frames without re-encoding
+
+        Either the last `seconds` of recording, or the range between the
+        `start` and `end` Unix timestamps. `format` is 'avi' or 'mjpeg'.
+        """
+        recorder = camera_streamer.recorder
+        if recorder is None:
+            raise HTTPException(status_code=404, detail="DVR is disabled")
+        # AVI declares the capture rate and holds frames between captures
+        avi = functools.partial(write_avi, fps=camera_streamer.pacer.target_fps)
+        writers = {'avi': (avi, 'video/x-msvideo'),
+                   'mjpeg': (write_mjpeg, 'video/x-motion-jpeg')}
+        if format not in writers:
+            raise HTTPException(status_code=400, detail=f"Unknown export format: {format}")
+        if start is None:
+            newest = recorder.stats()['newest'] or time.time()
+            start = newest - seconds
+
+        def export():
+            frames = recorder.frames(start, end)
+            return writers[format][0](frames) if frames else None
+
+        data = await asyncio.to_thread(export)
+        if data is None:
+            raise HTTPException(status_code=404, detail="No frames recorded in that range")
+        filename = f"raspacar-{int(start)}.{format}"
+        return Response(data, media_type=writers[format][1],
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    @app.websocket("/ws/video")
+    async def video_websocket(websocket: WebSocket, profile: str = None):
+        """
+        Binary WebSocket video stream
+
+        Each message is one frame: a WS_HEADER (frame number, capture
+        timestamp, encode time) followed by the JPEG. A client may ack
+        frames (the frame number as text; an ack covers earlier frames
+        too). Once it has acked one, at most `video_ack_window` frames are
+        in flight; a client that never acks is paced by the transport's
+        write buffer alone. Frames published while the window is full
+        replace each other in the latest-frame-wins send slot, so a slow
+        link gets fewer but current frames.
+        """
+        stream = camera_streamer.get_stream(profile)
+        if stream is None:
+            await websocket.close(code=1008)
+            return
+        # Start the camera before the handshake; 1013: try again later
+        if not await wait_ready('camera') or not await acquire_camera():
+            await websocket.close(code=1013)
+            return
+        viewer = stream.adaptive.add_viewer()
+        slot = stream.broadcaster.subscribe()
+        window = config['video_ack_window']
+        # Sent but not yet acked: frame number -> (frame, send time)
+        in_flight = {}
+        acked = asyncio.Event()
+        acking = False
+        receiver = None
+
+        def delivered(frame, sent):
+            elapsed = time.monotonic() - sent
+            send_seconds['websocket'].observe(elapsed)
+            frames_sent['websocket'].inc()
+            stream.adaptive.record(viewer, frame.number, elapsed,
+                                   age=time.time() - frame.timestamp)
+
+        async def receive_acks():
+            nonlocal acking
+            while True:
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    return
+                acking = True
+                try:
+                    number = int(message.get('text') or '')
+                except ValueError:
+                    # Anything else acks the oldest frame in flight
+                    number = min(in_flight, default=0)
+                for earlier in sorted(n for n in in_flight if n <= number):
+                    delivered(*in_flight.pop(earlier))
+                acked.set()
+
+        async def unless_closed(awaitable):
+            """Await `awaitable`, or raise WebSocketDisconnect once the client is gone"""
+            task = asyncio.ensure_future(awaitable)
+            await asyncio.wait({task, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if not task.done():
+                task.cancel()
+                # Re-raises a receive error
+                receiver.result()
+                raise WebSocketDisconnect()
+            return task.result()
+
+        try:
+            await websocket.accept()
+            receiver = asyncio.create_task(receive_acks())
+            while True:
+                if acking and len(in_flight) >= window:
+                    acked.clear()
+                    await unless_closed(acked.wait())
+                    continue
+                frame = await unless_closed(slot.get())
+                sent = time.monotonic()
+                # Returns once the frame fits in the transport's write buffer
+                await websocket.send_bytes(frame.ws_message())
+                if acking:
+                    in_flight[frame.number] = (frame, sent)
+                else:
+                    delivered(frame, sent)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            log_video.warning('video_ws_error', error=e)
+        finally:
+            if receiver is not None:
+                receiver.cancel()
+            stream.broadcaster.unsubscribe(slot)
+            stream.adaptive.remove_viewer(viewer)
+            camera_lifecycle.release()
+
+    @app.websocket("/ws/telemetry")
+    async def telemetry_websocket(websocket: WebSocket):
+        """Push a JSON telemetry snapshot every tick; slow clients skip snapshots"""
+        await websocket.accept()
+        slot = telemetry.subscribe()
+        try:
+            while True:
+                await websocket.send_text(await slot.get())
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            log.warning('telemetry_ws_error', error=e)
+        finally:
+            telemetry.unsubscribe(slot)
+
     @app.websocket("/ws")
     async def websocket_endpoint(websocket: WebSocket):
-        """WebSocket endpoint for control commands"""
-        await websocket.accept()
-        print("Client connected via WebSocket")
+        """
+        WebSocket endpoint for control commands
+
+        Client -> server: {"x", "y", "seq", "t"} commands and {"type": "pong", "id"}
+        replies. Server -> client: {"type": "config"} with the joystick
+        sampling rate and deadband on connect, {"type": "ping", "id", "t"} heartbeats,
+        {"type": "ack", "seq", "apply_ms"} once a command reached the motors,
+        and {"type": "stats"} with this connection's latency percentiles.
+
+        Clients offering the BINARY_SUBPROTOCOL may send commands as packed
+        COMMAND binary messages instead; everything else stays JSON.
+        """
+        binary = BINARY_SUBPROTOCOL in websocket.scope.get('subprotocols', ())
+        await websocket.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
+        await websocket.send_text(json.dumps(input_config))
+        client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+        session = ControlSession(asyncio.get_running_loop(), client,
+                                 protocol='binary' if binary else 'json', max_age=command_max_age)
+        sender = None
         try:
+            control_sessions[session.id] = session
+            sender = asyncio.create_task(_control_sender(websocket, session))
+            log.info('client_connected', session=session.id, client=client, protocol=session.protocol)
             while True:
-                data = await websocket.receive_text()
-                if data:
-                    try:
-                        command = json.loads(data)
-                        x = float(command.get('x', 0))
-                        y = float(command.get('y', 0))
-                        motor_controller.move(x, y)
-                        print(f"Command: x={x:.2f}, y={y:.2f}")
-                    except (json.JSONDecodeError, ValueError) as e:
-                        print(f"Invalid command: {e}")
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    raise WebSocketDisconnect(message.get('code', 1000))
+                received = time.perf_counter()
+                session.seen()
+                try:
+                    data = message.get('bytes')
+                    if data is not None:
+                        _apply_command(session, *decode_command(data))
+                    elif message.get('text'):
+                        command = json.loads(message['text'])
+                        if command.get('type') == 'pong':
+                            session.pong(command)
+                        else:
+                            seq = command.get('seq')
+                            client_time = command.get('t')
+                            _apply_command(session,
+                                           int(seq) if seq is not None else None,
+                                           float(client_time) if client_time is not None else None,
+                                           float(command.get('x', 0)),
+                                           float(command.get('y', 0)))
+                except (json.JSONDecodeError, ValueError, TypeError, AttributeError) as e:
+                    log.warning('command_invalid', session=session.id, error=e)
+                COMMAND_SECONDS.observe(time.perf_counter() - received)
         except WebSocketDisconnect:
-            print("Client disconnected normally")
+            pass
         except Exception as e:
-            print(f"WebSocket error: {e}")
+            log.warning('client_error', session=session.id, error=e)
         finally:
-            motor_controller.stop()
-            print("Client disconnected")
+            if sender is not None:
+                sender.cancel()
+            control_sessions.pop(session.id, None)
+            control_loop.stop_motors()
+            log.info('client_disconnected', session=session.id, commands=session.commands)
+
+    def _apply_command(session, seq, client_time, x, y):
+        """Hand a command to the control loop unless it is out of order or stale"""
+        session.commands += 1
+        if session.admit(seq, client_time, x, y):
+            control_loop.set(x, y, seq, session.applied)
+            log.debug('command', session=session.id, seq=seq, x=x, y=y)
+
+    async def _control_sender(websocket, session):
+        """Send acks as they arrive, and heartbeats and stats every interval"""
+        next_heartbeat = time.monotonic()
+        try:
+            while True:
+                timeout = next_heartbeat - time.monotonic()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(session.wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                session.wakeup.clear()
+
+                ack = session.take_ack()
+                if ack is not None:
+                    await websocket.send_text(json.dumps(ack))
+
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    # Clients that never answered a ping are never timed out
+                    if session.heartbeat_capable() and now - session.last_seen > heartbeat_timeout:
+                        log.warning('client_timeout', session=session.id, client=session.client)
+                        control_loop.stop_motors()
+                        await websocket.close(code=1001)
+                        return
+                    await websocket.send_text(json.dumps(session.ping()))
+                    stats = {'type': 'stats', 'rtt': session.rtt.stats(), 'apply': session.apply.stats()}
+                    await websocket.send_text(json.dumps(stats))
+                    next_heartbeat = now + heartbeat_interval
+        except Exception as e:
+            log.warning('client_send_error', session=session.id, error=e)
 
     return app
 
 
-if __name__ == "__main__":
+def serve(app, host="0.0.0.0", port=5000):
+    """
+    Run the app with uvicorn, bounding each connection's send buffering
+
+    Plain uvicorn.run() or the uvicorn command line would leave the kernel's
+    auto-tuned send buffers in place; from the command line, pass
+    `--http send_buffers:BoundedSendProtocol` (default `send_buffer`).
+    """
     import uvicorn
-    
+
+    protocol = bounded_http_protocol(app.state.config['send_buffer'])
+    uvicorn.run(app, host=host, port=port, http=protocol)
+
+
+if __name__ == "__main__":
     print("\n" + "="*50)
     print("Raspberry Pi Car WiFi Server")
     print("="*50)
     
     app = create_app()
         
-    print("\n✓ Server ready!")
+    print("\n✓ Server configured, starting hardware...")
     print(f"📱 Connect to WiFi: 'RPi-Car'")
     print(f"🌐 Open browser: http://192.168.4.1:5000")
     print("\nPress Ctrl+C to stop\n")
     
     try:
-        uvicorn.run(app, host="0.0.0.0", port=5000)
+        # Camera, control loop and motors are released by the app's lifespan
+        serve(app, host="0.0.0.0", port=5000)
     except KeyboardInterrupt:
         print("\nShutting down...")
     finally:
-        # Stop camera if still running
-        if camera_streamer.running:
-            camera_streamer.stop()
-        
-        # Stop motors
-        if motor_controller:
-            motor_controller.cleanup()
-        
         print("✓ Cleanup complete")
         print("👋 Goodbye!\n")
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Static-scene detection
+Skips JPEG encodes when the camera sees the same picture as last time
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class SceneChangeDetector:
+    """
+    Cheap change detector on a downsampled luma plane
+
+    Each captured frame is subsampled to every `step`-th pixel and reduced
+    to an approximate luma, (c0 + 2*c1 + c2) / 4, which is the same for RGB
+    and BGR channel order. The mean absolute difference against the last
+    frame published for a profile decides whether the new frame is worth
+    encoding for it. A frame is still forced through every
+    `refresh_interval` seconds so viewers and snapshots never go stale.
+
+    Checking and committing are separate steps: should_encode() only
+    compares, and commit() records the reference once the frame has
+    actually been published for that profile. A frame that no profile
+    encodes, or that the encode queue drops, never becomes a reference.
+    """
+
+    def __init__(self, threshold=2.0, refresh_interval=1.0, step=8, clock=time.monotonic):
+        """
+        Args:
+            threshold: mean absolute luma difference (0-255) below which the
+                scene counts as unchanged
+            refresh_interval: seconds after which an unchanged frame is
+                encoded anyway
+            step: subsampling stride in pixels
+            clock: monotonic clock in seconds
+        """
+        self.clock = clock
+        self.step = step
+        self.lock = threading.Lock()
+        self.configure(threshold, refresh_interval)
+        self.reset()
+
+    def configure(self, threshold=None, refresh_interval=None):
+        """Change the detection threshold and forced refresh interval"""
+        with self.lock:
+            if threshold is not None:
+                self.threshold = float(threshold)
+            if refresh_interval is not None:
+                self.refresh_interval = float(refresh_interval)
+
+    def reset(self):
+        """Forget the reference frame and counters"""
+        with self.lock:
+            # Profile name -> (luma of its last published frame, publish time)
+            self.references = {}
+            self.last_difference = 0.0
+            self.changed = 0
+            self.refreshed = 0
+            self.skipped = 0
+
+    def luma(self, array):
+        """Subsampled integer luma plane of an HxWx3 array"""
+        small = array[::self.step, ::self.step].astype(np.int16)
+        return (small[..., 0] + 2 * small[..., 1] + small[..., 2]) >> 2
+
+    def should_encode(self, luma, key=None):
+        """
+        True if `luma` differs enough from the last frame published for `key`
+
+        Args:
+            luma: luma() of the captured frame
+            key: profile name
+        """
+        now = self.clock()
+        with self.lock:
+            reference, published = self.references.get(key, (None, 0.0))
+            if reference is None or reference.shape != luma.shape:
+                changed = True
+            else:
+                self.last_difference = float(np.abs(luma - reference).mean())
+                changed = self.last_difference >= self.threshold
+
+            if changed:
+                self.changed += 1
+            elif now - published >= self.refresh_interval:
+                self.refreshed += 1
+            else:
+                self.skipped += 1
+                return False
+            return True
+
+    def commit(self, luma, key=None):
+        """Record `luma` as the picture viewers of profile `key` now have"""
+        with self.lock:
+            self.references[key] = (luma, self.clock())
+
+    def stats(self):
+        with self.lock:
+            return {
+                'threshold': self.threshold,
+                'refresh_interval': self.refresh_interval,
+                'last_difference': round(self.last_difference, 2),
+                'changed': self.changed,
+                'refreshed': self.refreshed,
+                'skipped': self.skipped,
+            }
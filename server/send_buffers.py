@@ -0,0 +1,44 @@
+"""
+Bounded send buffering for HTTP and WebSocket connections
+Keeps the data queued between a viewer's send slot and the network small,
+so a slow link makes the slot skip frames instead of buffering stale video
+"""
+import socket
+
+from uvicorn.protocols.http.auto import AutoHTTPProtocol
+
+# Requested SO_SNDBUF in bytes (Linux doubles it for bookkeeping)
+DEFAULT_SEND_BUFFER = 32 * 1024
+
+
+def bounded_http_protocol(send_buffer=DEFAULT_SEND_BUFFER):
+    """
+    uvicorn HTTP protocol class with small per-connection send buffers
+
+    Each accepted socket gets a fixed SO_SNDBUF instead of the kernel's
+    auto-tuned one (up to megabytes), and the asyncio transport pauses its
+    writer as soon as any data is left over in user space. A streaming
+    response's send then only returns once its frame fits in the kernel
+    buffer, so at most about `send_buffer` bytes of video wait per viewer.
+
+    Args:
+        send_buffer: SO_SNDBUF in bytes, None to leave the kernel default
+    """
+
+    class BoundedSendProtocol(AutoHTTPProtocol):
+        def connection_made(self, transport):
+            sock = transport.get_extra_info('socket')
+            if send_buffer and sock is not None:
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, send_buffer)
+                except OSError:
+                    pass
+            # Pause writers while anything is queued above the socket
+            transport.set_write_buffer_limits(high=0)
+            super().connection_made(transport)
+
+    return BoundedSendProtocol
+
+
+# For the uvicorn command line: --http send_buffers:BoundedSendProtocol
+BoundedSendProtocol = bounded_http_protocol()
@@ -0,0 +1,291 @@
+// Offer the binary command format; the server may still pick JSON
+const BINARY_PROTOCOL = 'raspacar.control.v1';
+const ws = new WebSocket(`ws://${window.location.host}/ws`, [BINARY_PROTOCOL]);
+const joystick = document.getElementById('joystick');
+const stick = document.getElementById('stick');
+const statusEl = document.getElementById('status');
+const xEl = document.getElementById('x');
+const yEl = document.getElementById('y');
+const latencyEl = document.getElementById('latency');
+const inputEl = document.getElementById('input');
+
+let isDragging = false;
+const maxRadius = 50;
+
+ws.onopen = () => {
+    statusEl.textContent = 'Connected';
+    statusEl.style.color = '#4CAF50';
+};
+
+ws.onclose = () => {
+    statusEl.textContent = 'Disconnected';
+    statusEl.style.color = '#f44336';
+};
+
+// Latency: the server pings us, acks commands once the motors are
+// set, and sends its RTT/apply percentiles for this connection
+let seq = 0;
+let commandRtt = null;
+const sentAt = new Map();
+
+function formatLatency(stats) {
+    return stats.count ? `${stats.p50_ms}/${stats.p95_ms}` : '--';
+}
+
+ws.onmessage = (e) => {
+    const msg = JSON.parse(e.data);
+    if (msg.type === 'config') {
+        startSampling(msg.input_rate, msg.deadband);
+    } else if (msg.type === 'ping') {
+        ws.send(JSON.stringify({type: 'pong', id: msg.id}));
+    } else if (msg.type === 'ack') {
+        const sent = sentAt.get(msg.seq);
+        if (sent !== undefined) {
+            commandRtt = performance.now() - sent;
+        }
+        // Acks only cover the newest command; older ones were superseded
+        for (const s of sentAt.keys()) {
+            if (s <= msg.seq) sentAt.delete(s);
+        }
+    } else if (msg.type === 'stats') {
+        latencyEl.textContent = `RTT ${formatLatency(msg.rtt)} ms | ` +
+            `Apply ${formatLatency(msg.apply)} ms` +
+            (commandRtt !== null ? ` | Cmd ${commandRtt.toFixed(1)} ms` : '');
+    }
+};
+
+function sendCommand(x, y) {
+    if (ws.readyState === WebSocket.OPEN) {
+        seq += 1;
+        sentAt.set(seq, performance.now());
+        if (sentAt.size > 256) {
+            sentAt.delete(sentAt.keys().next().value);
+        }
+        const t = Math.round(performance.now());
+        if (ws.protocol === BINARY_PROTOCOL) {
+            // seq (uint32), client time ms (uint32), x/y (int16)
+            const view = new DataView(new ArrayBuffer(12));
+            view.setUint32(0, seq);
+            view.setUint32(4, t >>> 0);
+            view.setInt16(8, Math.round(x * 32767));
+            view.setInt16(10, Math.round(y * 32767));
+            ws.send(view.buffer);
+        } else {
+            ws.send(JSON.stringify({x, y, seq, t}));
+        }
+        xEl.textContent = x.toFixed(2);
+        yEl.textContent = y.toFixed(2);
+        lastSent = {x, y};
+        sendCount += 1;
+    }
+}
+
+// Joystick events only move the target; it is sampled at the rate
+// the server advertises and sent when it moved past the deadband
+let target = {x: 0, y: 0};
+let lastSent = {x: 0, y: 0};
+let deadband = 0.02;
+let sampleTimer = null;
+let sendCount = 0;
+let suppressed = 0;
+
+function sampleJoystick() {
+    const dx = Math.abs(target.x - lastSent.x);
+    const dy = Math.abs(target.y - lastSent.y);
+    if (dx === 0 && dy === 0) {
+        return;
+    }
+    if (dx < deadband && dy < deadband) {
+        suppressed += 1;
+        return;
+    }
+    sendCommand(target.x, target.y);
+}
+
+function startSampling(rate, band) {
+    deadband = band;
+    clearInterval(sampleTimer);
+    sampleTimer = setInterval(sampleJoystick, 1000 / rate);
+}
+
+setInterval(() => {
+    inputEl.textContent = `Send ${sendCount}/s | Suppressed ${suppressed}`;
+    sendCount = 0;
+}, 1000);
+
+function setTarget(x, y) {
+    target = {x, y};
+    if (sampleTimer === null) {
+        // No config from the server yet: send directly
+        sendCommand(x, y);
+    }
+}
+
+function updateStick(clientX, clientY) {
+    const rect = joystick.getBoundingClientRect();
+    const centerX = rect.left + rect.width / 2;
+    const centerY = rect.top + rect.height / 2;
+
+    let dx = clientX - centerX;
+    let dy = clientY - centerY;
+    const distance = Math.sqrt(dx*dx + dy*dy);
+
+    if (distance > maxRadius) {
+        dx = (dx / distance) * maxRadius;
+        dy = (dy / distance) * maxRadius;
+    }
+
+    stick.style.left = (50 + dx) + 'px';
+    stick.style.top = (50 + dy) + 'px';
+
+    const x = dx / maxRadius;
+    const y = -dy / maxRadius;
+    setTarget(x, y);
+}
+
+function resetStick() {
+    stick.style.left = '50px';
+    stick.style.top = '50px';
+    // Always send the stop right away, whatever the deadband
+    target = {x: 0, y: 0};
+    sendCommand(0, 0);
+}
+
+// Touch events
+joystick.addEventListener('touchstart', (e) => {
+    e.preventDefault();
+    isDragging = true;
+    updateStick(e.touches[0].clientX, e.touches[0].clientY);
+});
+
+joystick.addEventListener('touchmove', (e) => {
+    e.preventDefault();
+    if (isDragging) {
+        updateStick(e.touches[0].clientX, e.touches[0].clientY);
+    }
+});
+
+joystick.addEventListener('touchend', (e) => {
+    e.preventDefault();
+    isDragging = false;
+    resetStick();
+});
+
+// Mouse events
+joystick.addEventListener('mousedown', (e) => {
+    isDragging = true;
+    updateStick(e.clientX, e.clientY);
+});
+
+document.addEventListener('mousemove', (e) => {
+    if (isDragging) {
+        updateStick(e.clientX, e.clientY);
+    }
+});
+
+document.addEventListener('mouseup', () => {
+    if (isDragging) {
+        isDragging = false;
+        resetStick();
+    }
+});
+
+// Prevent pinch zoom and other gestures
+document.addEventListener('gesturestart', (e) => e.preventDefault());
+document.addEventListener('gesturechange', (e) => e.preventDefault());
+document.addEventListener('gestureend', (e) => e.preventDefault());
+
+// Telemetry pushed by the server: motor throttles, camera FPS, clients
+const telemetryEl = document.getElementById('telemetry');
+const MOTORS = ['front_left', 'front_right', 'rear_left', 'rear_right'];
+const tws = new WebSocket(`ws://${window.location.host}/ws/telemetry`);
+
+tws.onmessage = (e) => {
+    const t = JSON.parse(e.data);
+    const motors = t.motors ?
+        MOTORS.map((name) => (t.motors[name] ?? 0).toFixed(2)).join(' ') : 'n/a';
+    const viewers = Object.values(t.connections.viewers).reduce((a, b) => a + b, 0);
+    telemetryEl.textContent = `Motors ${motors} | Camera ${t.camera.achieved_fps} fps | ` +
+        `Drivers ${t.connections.control} | Viewers ${viewers}`;
+};
+
+// Binary WebSocket video (open the page with ?video=ws)
+// Each message: uint32 frame id, float64 capture time, uint32 encode us, JPEG;
+// every frame is acked with its id
+const params = new URLSearchParams(window.location.search);
+
+function startWsVideo() {
+    const img = document.getElementById('video');
+    const canvas = document.getElementById('canvas');
+    const ctx = canvas.getContext('2d');
+    const videoInfoEl = document.getElementById('videoInfo');
+    const profile = params.get('profile');
+
+    img.removeAttribute('src');
+    img.style.display = 'none';
+    canvas.style.display = 'block';
+
+    const vws = new WebSocket(`ws://${window.location.host}/ws/video` +
+        (profile ? `?profile=${encodeURIComponent(profile)}` : ''));
+    vws.binaryType = 'arraybuffer';
+
+    let pending = null;
+    let decoding = false;
+    let lastId = 0;
+    let dropped = 0;
+    let minDelay = Infinity;
+
+    async function renderLatest() {
+        decoding = true;
+        while (pending) {
+            const data = pending;
+            pending = null;
+            const view = new DataView(data);
+            const id = view.getUint32(0);
+            const captured = view.getFloat64(4);
+            const encodeUs = view.getUint32(12);
+            if (id <= lastId) {
+                dropped++;
+                continue;
+            }
+            const blob = new Blob([new Uint8Array(data, 16)], {type: 'image/jpeg'});
+            const bitmap = await createImageBitmap(blob);
+            if (canvas.width !== bitmap.width || canvas.height !== bitmap.height) {
+                canvas.width = bitmap.width;
+                canvas.height = bitmap.height;
+            }
+            ctx.drawImage(bitmap, 0, 0);
+            bitmap.close();
+            lastId = id;
+
+            // Clocks are not synchronised: show latency above the best seen
+            const delay = Date.now() / 1000 - captured;
+            minDelay = Math.min(minDelay, delay);
+            videoInfoEl.textContent = `Frame ${id} | +${((delay - minDelay) * 1000).toFixed(0)} ms | ` +
+                `enc ${(encodeUs / 1000).toFixed(1)} ms | dropped ${dropped}`;
+        }
+        decoding = false;
+    }
+
+    vws.onmessage = (e) => {
+        // Ack on receipt: the server keeps only a few frames in flight
+        vws.send(String(new DataView(e.data).getUint32(0)));
+        // Latest frame wins: a frame still waiting to be drawn is dropped
+        if (pending) {
+            dropped++;
+        }
+        pending = e.data;
+        if (!decoding) {
+            renderLatest();
+        }
+    };
+
+    vws.onclose = () => {
+        videoInfoEl.textContent = 'Video disconnected';
+        setTimeout(startWsVideo, 1000);
+    };
+}
+
+if (params.get('video') === 'ws') {
+    startWsVideo();
+}
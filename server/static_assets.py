@@ -0,0 +1,133 @@
+"""
+Precompressed static assets
+The control page, its script and styles, compressed once at startup and
+served with strong validators so reloads cost a 304
+"""
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+}
+
+# Hashed URLs never change content, so browsers may keep them for a year
+# without revalidating; the page itself must always be revalidated
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+class StaticAsset:
+    """
+    One asset in every encoding the client may ask for
+
+    The body is hashed and compressed once; each encoding gets its own
+    strong ETag since its bytes differ.
+    """
+
+    def __init__(self, name, body, content_type, cache_control=IMMUTABLE):
+        """
+        Args:
+            name: file name, e.g. 'app.js'
+            body: content bytes
+            content_type: Content-Type header value
+            cache_control: Cache-Control header value
+        """
+        self.name = name
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.hash = hashlib.sha256(body).hexdigest()[:16]
+        root, ext = os.path.splitext(name)
+        self.url = f'/static/{root}.{self.hash}{ext}'
+
+        # encoding -> (bytes, ETag); only kept where compression pays off
+        self.encodings = {'identity': (body, f'"{self.hash}"')}
+        if brotli is not None:
+            self._add('br', brotli.compress(body, quality=11), body)
+        self._add('gzip', gzip.compress(body, compresslevel=9, mtime=0), body)
+
+    def _add(self, encoding, data, body):
+        if len(data) < len(body):
+            self.encodings[encoding] = (data, f'"{self.hash}-{encoding}"')
+
+    def select(self, accept_encoding):
+        """Best (encoding, bytes, ETag) for an Accept-Encoding header"""
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.encodings:
+                return (encoding,) + self.encodings[encoding]
+        return ('identity',) + self.encodings['identity']
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header names any representation of this asset"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return any(etag in tags for _, etag in self.encodings.values())
+
+
+class StaticAssets:
+    """
+    Loads the static directory and builds the page that references it
+
+    Every file is served under a content-hashed URL; the page template
+    gets those URLs substituted for its {{name}} placeholders.
+    """
+
+    def __init__(self, page_template, directory=STATIC_DIR):
+        """
+        Args:
+            page_template: HTML with {{name}} placeholders for assets
+            directory: folder holding the assets
+        """
+        self.assets = {}
+        self.by_url = {}
+        for name in sorted(os.listdir(directory)):
+            content_type = CONTENT_TYPES.get(os.path.splitext(name)[1])
+            if content_type is None:
+                continue
+            with open(os.path.join(directory, name), 'rb') as f:
+                asset = StaticAsset(name, f.read(), content_type)
+            self.assets[name] = asset
+            self.by_url[asset.url] = asset
+
+        page = page_template
+        for name, asset in self.assets.items():
+            page = page.replace('{{' + name + '}}', asset.url)
+        self.page = StaticAsset('index.html', page.encode('utf-8'),
+                                CONTENT_TYPES['.html'], cache_control=REVALIDATE)
+
+    def get(self, url):
+        """Asset for a hashed /static/ URL, None if unknown or outdated"""
+        return self.by_url.get(url)
+
+
+def _accepted_encodings(header):
+    """Content codings with a non-zero q value"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q=') and _q_value(params[2:]) == 0:
+            continue
+        if coding:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def _q_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return 1.0
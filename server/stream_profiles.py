@@ -0,0 +1,64 @@
+"""
+Stream profiles for simulcast video
+Each profile is an output size, JPEG quality and frame rate cap
+"""
+import numpy as np
+
+
+class StreamProfile:
+    """A named output variant of the camera stream"""
+
+    def __init__(self, name, size=None, quality=85, max_fps=None):
+        """
+        Args:
+            name: profile name used in /video_feed?profile=...
+            size: (width, height) output size, None for the capture size
+            quality: JPEG quality
+            max_fps: frame rate cap, None to follow the capture rate
+        """
+        self.name = name
+        self.size = tuple(size) if size else None
+        self.quality = quality
+        self.max_fps = max_fps
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'size': list(self.size) if self.size else None,
+            'quality': self.quality,
+            'max_fps': self.max_fps,
+        }
+
+
+# Full resolution driver view plus cheaper spectator variants
+DEFAULT_PROFILES = [
+    StreamProfile('driver'),
+    StreamProfile('spectator', size=(320, 240), quality=60, max_fps=15),
+    StreamProfile('thumbnail', size=(160, 120), quality=50, max_fps=5),
+]
+
+
+def downscale(array, size):
+    """
+    Resize a captured HxWxC array to (width, height) without leaving NumPy
+
+    Integer reduction factors average each block of pixels; other factors
+    fall back to nearest-neighbour sampling. Both are single vectorised
+    operations on the array, so no JPEG is decoded or re-encoded.
+    """
+    height, width = array.shape[:2]
+    out_width, out_height = size
+    if (out_width, out_height) == (width, height):
+        return array
+
+    fy, ry = divmod(height, out_height)
+    fx, rx = divmod(width, out_width)
+    if ry == 0 and rx == 0 and fx >= 1 and fy >= 1:
+        blocks = array.reshape(out_height, fy, out_width, fx, -1)
+        summed = blocks.sum(axis=(1, 3), dtype=np.uint32)
+        return (summed // (fx * fy)).astype(array.dtype).reshape(
+            (out_height, out_width) + array.shape[2:])
+
+    rows = (np.arange(out_height) * height) // out_height
+    cols = (np.arange(out_width) * width) // out_width
+    return array[rows[:, None], cols]
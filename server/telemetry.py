@@ -0,0 +1,93 @@
+"""
+Server-pushed telemetry
+Periodic snapshots of motor, camera and connection state for /ws/telemetry
+"""
+import asyncio
+import json
+import time
+
+from event_log import get_logger
+from frame_broadcaster import ViewerSlot
+from metrics import TELEMETRY_DROPPED
+
+log = get_logger('telemetry')
+
+
+class TelemetryBroadcaster:
+    """
+    Samples a snapshot at a fixed rate and fans it out to subscribers
+
+    Each tick calls `snapshot()` and serializes the result to JSON once;
+    every subscriber gets the same string in its own latest-wins slot, so
+    the per-tick cost does not grow with the number of subscribers beyond
+    a slot assignment each, and a slow subscriber only skips snapshots.
+    The sampling task runs only while someone is subscribed.
+    """
+
+    def __init__(self, snapshot, rate=5.0):
+        """
+        Args:
+            snapshot: callable returning a JSON-serializable dict; runs on
+                the event loop, so it must not block
+            rate: snapshots per second
+        """
+        self.snapshot = snapshot
+        self.period = 1.0 / rate
+        self.slots = set()
+        self.task = None
+        self.ticks = 0
+        self.serialize_time = 0.0
+        self.latest = None
+
+    def subscribe(self):
+        """Register a subscriber slot and start sampling if needed"""
+        slot = ViewerSlot(drop_counter=TELEMETRY_DROPPED)
+        self.slots.add(slot)
+        if self.latest is not None:
+            slot.put(self.latest)
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return slot
+
+    def unsubscribe(self, slot):
+        self.slots.discard(slot)
+        if not self.slots and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                log.error('telemetry_error', error=e)
+            # Absolute deadlines keep the rate steady; skip ticks if late
+            next_tick += self.period
+            now = time.monotonic()
+            if next_tick < now:
+                next_tick = now + self.period
+            await asyncio.sleep(next_tick - now)
+
+    def publish(self):
+        """Take one snapshot, serialize it once and offer it to every subscriber"""
+        snapshot = self.snapshot()
+        snapshot['type'] = 'telemetry'
+        snapshot['t'] = time.time()
+        started = time.perf_counter()
+        message = json.dumps(snapshot, separators=(',', ':'))
+        self.serialize_time = time.perf_counter() - started
+        self.latest = message
+        self.ticks += 1
+        for slot in self.slots:
+            slot.put(message)
+
+    def stats(self):
+        return {
+            'rate': round(1.0 / self.period, 2),
+            'subscribers': len(self.slots),
+            'ticks': self.ticks,
+            'serialize_ms': round(self.serialize_time * 1000, 3),
+            'bytes': len(self.latest) if self.latest is not None else 0,
+            'dropped': sum(slot.dropped for slot in self.slots),
+        }
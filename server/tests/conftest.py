@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# The server modules are flat and imported by bare name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app_config():
+    """create_app() settings for tests: synthetic camera, no motors, quiet logs"""
+    return {'camera_backend': 'synthetic', 'motor_backend': None, 'log_level': 'WARNING'}
@@ -0,0 +1,88 @@
+"""The quality controller must react to a slow link, not only to skipped frames"""
+from adaptive_quality import AdaptiveQualityController
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run_window(controller, clock, viewer, first, count, age, step=1):
+    for number in range(first, first + count * step, step):
+        clock.now += 0.1
+        controller.record(viewer, number, age=age)
+    return first + count * step
+
+
+def test_old_frames_step_quality_down():
+    clock = Clock()
+    controller = AdaptiveQualityController(quality=85, window=1.0, clock=clock)
+    viewer = controller.add_viewer()
+    # Every frame delivered, but each one half a second old
+    _run_window(controller, clock, viewer, 1, 12, age=0.5)
+    assert controller.state()['last_decision'] == 'quality down'
+    assert controller.quality == 75
+
+
+def test_fresh_frames_recover():
+    clock = Clock()
+    controller = AdaptiveQualityController(quality=85, window=1.0, upgrade_windows=1, clock=clock)
+    viewer = controller.add_viewer()
+    number = _run_window(controller, clock, viewer, 1, 12, age=0.5)
+    number = _run_window(controller, clock, viewer, number, 12, age=0.01)
+    number = _run_window(controller, clock, viewer, number, 12, age=0.01)
+    assert controller.quality == 85
+
+
+def test_skipped_frames_step_quality_down():
+    clock = Clock()
+    controller = AdaptiveQualityController(quality=85, window=1.0, clock=clock)
+    viewer = controller.add_viewer()
+    _run_window(controller, clock, viewer, 1, 12, age=0.01, step=3)
+    assert controller.quality == 75
+
+
+def test_windows_close_without_deliveries():
+    clock = Clock()
+    controller = AdaptiveQualityController(quality=85, window=1.0, clock=clock)
+    viewer = controller.add_viewer()
+    controller.record(viewer, 1, age=0.5)
+    clock.now += 1.5
+    controller.settings()
+    assert controller.quality == 75
+
+
+def test_one_slow_viewer_does_not_degrade_healthy_ones():
+    clock = Clock()
+    controller = AdaptiveQualityController(quality=85, window=1.0, clock=clock)
+    healthy = [controller.add_viewer() for _ in range(3)]
+    slow = controller.add_viewer()
+    # The slow viewer renders at 5 FPS of 30: one frame in six, each old
+    for window in range(5):
+        for number in range(window * 30 + 1, window * 30 + 31):
+            clock.now += 1.0 / 30
+            for viewer in healthy:
+                controller.record(viewer, number, age=0.01)
+            if number % 6 == 0:
+                controller.record(slow, number, age=0.4)
+    state = controller.state()
+    assert controller.quality == 85
+    assert state['delivery_ratio'] == 1.0
+    assert state['worst_delivery_ratio'] < 0.3
+
+
+def test_most_viewers_slow_steps_down():
+    clock = Clock()
+    controller = AdaptiveQualityController(quality=85, window=1.0, clock=clock)
+    healthy, slow = controller.add_viewer(), controller.add_viewer()
+    slow_second = controller.add_viewer()
+    for number in range(1, 41):
+        clock.now += 1.0 / 30
+        controller.record(healthy, number, age=0.01)
+        if number % 3 == 0:
+            controller.record(slow, number, age=0.01)
+            controller.record(slow_second, number, age=0.01)
+    assert controller.quality == 75
@@ -0,0 +1,39 @@
+"""Heartbeat timeouts only apply to clients that answer pings"""
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from raspacar_server import create_app
+
+HEARTBEAT = {'heartbeat_interval': 0.05, 'heartbeat_timeout': 0.2}
+
+
+def _pings(ws, count):
+    """Read until `count` pings arrived; returns the last one"""
+    seen = 0
+    while True:
+        message = ws.receive_json()
+        if message['type'] == 'ping':
+            seen += 1
+            if seen == count:
+                return message
+
+
+def test_plain_client_is_not_timed_out(app_config):
+    with TestClient(create_app(dict(app_config, **HEARTBEAT))) as client:
+        with client.websocket_connect('/ws') as ws:
+            assert ws.receive_json()['type'] == 'config'
+            ws.send_json({'x': 0, 'y': 0})
+            # Twenty heartbeats span five timeouts
+            _pings(ws, 20)
+            ws.send_json({'x': 0, 'y': 0.5})
+
+
+def test_silent_heartbeat_client_is_closed(app_config):
+    with TestClient(create_app(dict(app_config, **HEARTBEAT))) as client:
+        with client.websocket_connect('/ws') as ws:
+            assert ws.receive_json()['type'] == 'config'
+            ping = _pings(ws, 1)
+            ws.send_json({'type': 'pong', 'id': ping['id']})
+            with pytest.raises(WebSocketDisconnect):
+                _pings(ws, 40)
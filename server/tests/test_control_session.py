@@ -0,0 +1,93 @@
+"""Command ordering, staleness and binary decoding on the control WebSocket"""
+import struct
+
+import pytest
+
+from control_session import COMMAND, ControlSession, decode_command, encode_command
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _session(max_age=0.5):
+    clock = Clock()
+    return ControlSession(None, max_age=max_age, clock=clock), clock
+
+
+def test_out_of_order_and_duplicate_seq_are_dropped():
+    session, _ = _session()
+    assert session.admit(1, None, 0.5, 0.5)
+    assert session.admit(3, None, 0.5, 0.5)
+    assert not session.admit(2, None, 0.5, 0.5)
+    assert not session.admit(3, None, 0.5, 0.5)
+    assert session.admit(4, None, 0.5, 0.5)
+    assert session.dropped_out_of_order == 2
+
+
+def test_stop_bypasses_ordering_and_staleness():
+    session, clock = _session()
+    assert session.admit(5, 0.0, 0.5, 0.5)
+    # An older stop still applies, without moving the sequence back
+    assert session.admit(4, None, 0.0, 0.0)
+    assert not session.admit(5, None, 0.5, 0.5)
+    # A stop two seconds late applies too
+    clock.now += 2.0
+    assert session.admit(6, 0.0, 0.0, 0.0)
+    assert not session.admit(7, 0.0, 0.5, 0.5)
+    assert session.dropped_out_of_order == 1
+    assert session.dropped_stale == 1
+
+
+def test_late_command_is_dropped_as_stale():
+    session, clock = _session()
+    assert session.admit(1, 0.0, 0.5, 0.5)
+    clock.now += 1.0
+    # Sent 100 ms after the first one, but arrived a second later
+    assert not session.admit(2, 100.0, 0.5, 0.5)
+    assert session.dropped_stale == 1
+
+
+def test_shifted_delay_resets_the_baseline():
+    session, clock = _session()
+    assert session.admit(1, 0.0, 0.5, 0.5)
+    # From now on every command takes 800 ms longer to arrive
+    client_time = 0.0
+    admitted = []
+    for seq in range(2, 40):
+        clock.now += 0.1
+        client_time += 100.0
+        admitted.append(session.admit(seq, client_time - 800.0, 0.5, 0.5))
+    assert session.baseline_resets == 1
+    # Dropped for a second, then applied again against the new baseline
+    assert admitted[:10] == [False] * 10
+    assert all(admitted[11:])
+
+
+def test_decode_round_trip():
+    seq, client_time, x, y = decode_command(encode_command(7, 123456, 0.5, -1.0))
+    assert (seq, client_time) == (7, 123456)
+    assert x == pytest.approx(0.5, abs=1e-4)
+    assert y == -1.0
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    encode_command(1, 0, 0.0, 0.0)[:-1],
+    encode_command(1, 0, 0.0, 0.0) + b'\0',
+    COMMAND.pack(1, 0, -32768, 0),
+    COMMAND.pack(1, 0, 0, -32768),
+])
+def test_decode_rejects_malformed_commands(data):
+    with pytest.raises(ValueError):
+        decode_command(data)
+
+
+def test_decode_accepts_every_in_range_value():
+    for value in (-32767, -1, 0, 1, 32767):
+        _, _, x, y = decode_command(struct.pack('!IIhh', 1, 0, value, value))
+        assert -1.0 <= x <= 1.0 and -1.0 <= y <= 1.0
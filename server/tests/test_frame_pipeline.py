@@ -0,0 +1,69 @@
+"""Encode-stage plumbing: drop-oldest hand-off and in-order publishing"""
+import threading
+
+import pytest
+
+from frame_pipeline import DropOldestQueue, ReorderBuffer
+
+
+def test_reorder_publishes_in_reservation_order():
+    emitted = []
+    reorder = ReorderBuffer(emitted.append)
+    for number in range(1, 5):
+        reorder.reserve(number)
+    reorder.complete(3, 'c')
+    reorder.complete(2, 'b')
+    assert emitted == []
+    reorder.complete(1, 'a')
+    assert emitted == ['a', 'b', 'c']
+    reorder.complete(4, 'd')
+    assert emitted == ['a', 'b', 'c', 'd']
+    assert len(reorder) == 0
+
+
+def test_cancel_unblocks_the_frames_behind_it():
+    emitted = []
+    reorder = ReorderBuffer(emitted.append)
+    for number in range(1, 4):
+        reorder.reserve(number)
+    reorder.complete(2, 'b')
+    reorder.complete(3, 'c')
+    reorder.cancel(1)
+    assert emitted == ['b', 'c']
+    # A late result for the cancelled number is ignored
+    reorder.complete(1, 'a')
+    assert emitted == ['b', 'c']
+
+
+def test_unreserved_numbers_are_ignored():
+    emitted = []
+    reorder = ReorderBuffer(emitted.append)
+    reorder.complete(7, 'x')
+    reorder.cancel(8)
+    assert emitted == []
+
+
+def test_full_queue_returns_the_evicted_item():
+    queue = DropOldestQueue(2)
+    assert queue.put(1) is None
+    assert queue.put(2) is None
+    assert queue.put(3) == 1
+    assert queue.put(4) == 2
+    assert [queue.get(0), queue.get(0)] == [3, 4]
+    assert queue.get(0) is None
+
+
+def test_close_wakes_a_waiting_consumer():
+    queue = DropOldestQueue(1)
+    results = []
+    consumer = threading.Thread(target=lambda: results.append(queue.get(timeout=5)))
+    consumer.start()
+    queue.close()
+    consumer.join(1)
+    assert not consumer.is_alive()
+    assert results == [None]
+
+
+def test_queue_size_must_be_positive():
+    with pytest.raises(ValueError):
+        DropOldestQueue(0)
@@ -0,0 +1,73 @@
+"""The DVR ring must never hand out a partly overwritten frame; exports keep its timing"""
+import io
+import random
+import struct
+
+from PIL import Image
+
+from frame_recorder import FrameRingBuffer, write_avi
+
+
+def _tiny_jpeg():
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 8)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def _frame(number, rng):
+    return bytes([number % 256]) * rng.randint(1, 300)
+
+
+def test_random_sizes_never_corrupt_frames():
+    rng = random.Random(1234)
+    ring = FrameRingBuffer(1000, 10)
+    written = {}
+    for number in range(5000):
+        jpeg = _frame(number, rng)
+        written[float(number)] = jpeg
+        ring.append(jpeg, float(number))
+
+        frames = ring.frames()
+        assert frames[-1][0] == number
+        assert [t for t, _ in frames] == sorted(t for t, _ in frames)
+        for timestamp, data in frames:
+            assert data == written[timestamp], f"frame {timestamp} corrupted after append {number}"
+        assert sum(len(data) for _, data in frames) <= ring.byte_budget
+        assert len(frames) <= ring.max_frames
+
+
+def test_keeps_as_many_recent_frames_as_fit():
+    ring = FrameRingBuffer(1000, 100)
+    for number in range(50):
+        ring.append(b'x' * 100, float(number))
+    frames = ring.frames()
+    assert len(frames) == 10
+    assert [t for t, _ in frames] == [float(n) for n in range(40, 50)]
+
+
+def test_ring_sized_for_duration_holds_it():
+    ring = FrameRingBuffer.for_duration(30, 30, (640, 480))
+    jpeg = b'x' * 60 * 1024
+    for number in range(40 * 30):
+        ring.append(jpeg, number / 30)
+    assert ring.stats()['seconds'] >= 29.9
+
+
+def _avi_index(data):
+    """(offset, size) of every idx1 entry"""
+    start = data.rindex(b'idx1')
+    size = struct.unpack_from('<I', data, start + 4)[0]
+    return [struct.unpack_from('<II', data, start + 8 + i + 8) for i in range(0, size, 16)]
+
+
+def test_avi_holds_frames_until_the_next_capture():
+    jpeg = _tiny_jpeg()
+    # Steady 10 FPS, then a still scene with one refresh a second later
+    frames = [(0.0, jpeg), (0.1, jpeg + b'\0'), (0.2, jpeg + b'\0\0'), (1.2, jpeg + b'\0\0\0')]
+    index = _avi_index(write_avi(frames, fps=10))
+    assert len(index) == 13
+    sizes = [size for _, size in index]
+    assert sizes[:3] == [len(jpeg), len(jpeg) + 1, len(jpeg) + 2]
+    # The third frame is shown until the refresh, ten ticks later
+    assert sizes[2:12] == [len(jpeg) + 2] * 10
+    assert sizes[12] == len(jpeg) + 3
@@ -0,0 +1,32 @@
+"""Invalid logging settings are rejected as a whole and change nothing"""
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+import event_log
+from raspacar_server import create_app
+
+@pytest.mark.parametrize('sampling', [{'client_connected': 'x'}, {'client_connected': -1},
+                                      {'client_connected': True}, ['client_connected']])
+def test_invalid_sampling_is_not_applied(sampling):
+    with pytest.raises((TypeError, ValueError)):
+        event_log.configure({'control': 'DEBUG'}, sampling)
+    assert logging.getLogger('raspacar.control').level != logging.DEBUG
+    assert event_log.state()['sampling'].get('client_connected', {}).get('per_second') is None
+
+
+def test_invalid_level_is_not_applied():
+    with pytest.raises(ValueError):
+        event_log.configure({'': 'LOUD'}, {'command_test': 3})
+    assert 'command_test' not in event_log.state()['sampling']
+
+
+def test_control_socket_survives_bad_logging_request(app_config):
+    with TestClient(create_app(app_config)) as client:
+        response = client.post('/logging', json={'sampling': {'client_connected': 'x'}})
+        assert response.status_code == 400
+        with client.websocket_connect('/ws') as ws:
+            assert ws.receive_json()['type'] == 'config'
+            assert len(client.get('/control/connections').json()) == 1
+        assert client.get('/control/connections').json() == []
@@ -0,0 +1,44 @@
+"""A setpoint whose move() fails must be retried, not treated as applied"""
+import time
+
+from motor_control_loop import MotorControlLoop
+
+
+class FlakyController:
+    def __init__(self, failures):
+        self.failures = failures
+        self.moves = []
+
+    def move(self, x, y):
+        if self.failures:
+            self.failures -= 1
+            raise OSError(121, 'Remote I/O error')
+        self.moves.append((x, y))
+
+    def stop(self):
+        self.moves.append((0.0, 0.0))
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_failed_stop_is_retried():
+    controller = FlakyController(failures=0)
+    loop = MotorControlLoop(controller, rate=200)
+    loop.start()
+    try:
+        loop.set(0.0, 0.8)
+        _wait_for(lambda: controller.moves[-1:] == [(0.0, 0.8)])
+
+        controller.failures = 3
+        applied = []
+        loop.set(0.0, 0.0, seq=7, on_applied=lambda setpoint, latency: applied.append(setpoint.seq))
+        _wait_for(lambda: applied == [7])
+        assert controller.moves[-1] == (0.0, 0.0)
+        assert loop.errors == 3
+    finally:
+        loop.shutdown()
@@ -0,0 +1,67 @@
+"""Write suppression must not hide a failed I2C write"""
+import pytest
+
+from motor_controller import MOTOR_HAT_CHANNELS, AdafruitMotorController
+from motor_sim import SimulatedPCA9685
+
+
+def _controller():
+    return AdafruitMotorController(pca=SimulatedPCA9685(bus_speed=1e9, overhead=0))
+
+
+def _fail_next_write(pca):
+    device = pca.i2c_device
+    write = device.write
+
+    def failing(*args, **kwargs):
+        device.write = write
+        raise OSError(121, 'Remote I/O error')
+
+    device.write = failing
+
+
+def _stopped(pca):
+    # Motor HAT stop is brake mode: both inputs fully on
+    return all(pca.duty_cycle(in1) == pca.duty_cycle(in2) == 0xFFFF
+               for _, in1, in2 in MOTOR_HAT_CHANNELS.values())
+
+
+def test_stop_after_failed_stop_is_written():
+    controller = _controller()
+    sim = controller.pca.pca
+    controller.move(0, 0.8)
+    assert not _stopped(sim)
+
+    _fail_next_write(sim)
+    with pytest.raises(OSError):
+        controller.stop()
+    assert not _stopped(sim)
+
+    before = sim.i2c_device.transactions
+    controller.stop()
+    assert sim.i2c_device.transactions > before
+    assert _stopped(sim)
+    assert all(speed == 0 for speed in controller.throttle_state().values())
+
+
+def test_failed_move_is_retried():
+    controller = _controller()
+    sim = controller.pca.pca
+    controller.stop()
+
+    _fail_next_write(sim)
+    with pytest.raises(OSError):
+        controller.move(0, 0.5)
+    controller.move(0, 0.5)
+    outputs = sim.outputs()
+    assert controller.throttle_state()['front_left'] == 0.5
+    assert any(outputs[in1] != outputs[in2] for _, in1, in2 in MOTOR_HAT_CHANNELS.values())
+
+
+def test_unchanged_writes_still_suppressed():
+    controller = _controller()
+    sim = controller.pca.pca
+    controller.move(0, 0.8)
+    before = sim.i2c_device.transactions
+    controller.move(0, 0.8)
+    assert sim.i2c_device.transactions == before
@@ -0,0 +1,24 @@
+"""A profile's frame rate cap holds after the stream has been idle"""
+from cam_streamer import ProfileStream
+from stream_profiles import StreamProfile
+
+
+def _due(stream, times, tolerance=0.01):
+    return [t for t in times if stream.is_due(t, tolerance)]
+
+
+def test_cap_holds_at_capture_rate():
+    stream = ProfileStream(StreamProfile('capped', max_fps=10))
+    # 30 FPS capture for one second
+    times = [1000.0 + i / 30 for i in range(30)]
+    assert len(_due(stream, times)) == 10
+
+
+def test_cap_holds_after_idle_gap():
+    stream = ProfileStream(StreamProfile('capped', max_fps=10))
+    _due(stream, [1000.0 + i / 30 for i in range(30)])
+    # Viewers return five seconds later: still one frame in three
+    times = [1006.0 + i / 30 for i in range(30)]
+    due = _due(stream, times)
+    assert len(due) == 10
+    assert all(b - a > 0.09 for a, b in zip(due, due[1:]))
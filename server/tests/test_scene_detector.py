@@ -0,0 +1,58 @@
+"""A scene reference only counts once its frame was published for that profile"""
+import numpy as np
+
+from scene_detector import SceneChangeDetector
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _picture(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def _detector():
+    clock = Clock()
+    return SceneChangeDetector(threshold=2.0, refresh_interval=1.0, clock=clock), clock
+
+
+def test_unchanged_frame_is_skipped_after_commit():
+    detector, clock = _detector()
+    luma = detector.luma(_picture(10))
+    assert detector.should_encode(luma, 'driver')
+    detector.commit(luma, 'driver')
+    clock.now += 0.1
+    assert not detector.should_encode(detector.luma(_picture(10)), 'driver')
+    clock.now += 1.0
+    assert detector.should_encode(detector.luma(_picture(10)), 'driver')
+
+
+def test_profile_that_skipped_the_change_still_gets_it():
+    detector, clock = _detector()
+    old, new = detector.luma(_picture(10)), detector.luma(_picture(200))
+    for profile in ('driver', 'thumbnail'):
+        detector.commit(old, profile)
+    # The change is published for the driver; the capped thumbnail was not due
+    clock.now += 0.05
+    assert detector.should_encode(new, 'driver')
+    detector.commit(new, 'driver')
+    # Motion stops: identical frames follow
+    clock.now += 0.05
+    assert not detector.should_encode(new, 'driver')
+    assert detector.should_encode(new, 'thumbnail')
+
+
+def test_dropped_frame_does_not_become_the_reference():
+    detector, clock = _detector()
+    old, new = detector.luma(_picture(10)), detector.luma(_picture(200))
+    detector.commit(old, 'driver')
+    clock.now += 0.05
+    # Checked and queued, then evicted by the encode queue: never committed
+    assert detector.should_encode(new, 'driver')
+    clock.now += 0.05
+    assert detector.should_encode(new, 'driver')
@@ -0,0 +1,82 @@
+"""Hardware initialises in the background, and the camera is opened once"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from raspacar_server import create_app
+
+def _slow_camera(app, delay):
+    """Delay the streamer's camera initialisation; returns the call list"""
+    streamer = app.state.camera_streamer
+    init_camera = streamer.init_camera
+    calls = []
+
+    def slow_init():
+        calls.append(time.monotonic())
+        time.sleep(delay)
+        init_camera()
+
+    streamer.init_camera = slow_init
+    return calls
+
+
+def _broken_camera(app):
+    """Make every camera initialisation fail"""
+    def broken_init():
+        raise RuntimeError('no camera attached')
+
+    app.state.camera_streamer.init_camera = broken_init
+
+
+def test_server_answers_while_camera_initialises(app_config):
+    app = create_app(dict(app_config, init_timeout=0.1))
+    _slow_camera(app, 1.0)
+    started = time.monotonic()
+    with TestClient(app) as client:
+        assert time.monotonic() - started < 0.5
+        assert client.get('/startup').json()['camera'] == {'ok': None}
+        assert client.get('/snapshot').status_code == 503
+
+
+def test_camera_is_opened_once_when_init_outlasts_the_timeout(app_config):
+    app = create_app(dict(app_config, init_timeout=0.2))
+    calls = _slow_camera(app, 0.6)
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 5.0
+        response = client.get('/snapshot')
+        while response.status_code == 503 and time.monotonic() < deadline:
+            response = client.get('/snapshot')
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'image/jpeg'
+        assert client.get('/startup').json()['camera']['ok'] is True
+    assert len(calls) == 1
+
+
+def test_snapshot_without_a_camera_is_unavailable(app_config):
+    app = create_app(app_config)
+    _broken_camera(app)
+    with TestClient(app) as client:
+        response = client.get('/snapshot')
+        assert response.status_code == 503
+        assert response.json()['detail'] == 'No camera frame available'
+
+
+def test_video_feed_without_a_camera_is_unavailable(app_config):
+    app = create_app(app_config)
+    _broken_camera(app)
+    with TestClient(app) as client:
+        response = client.get('/video_feed')
+        assert response.status_code == 503
+        assert response.json()['detail'] == 'Camera could not start'
+
+
+def test_video_websocket_without_a_camera_is_refused(app_config):
+    app = create_app(app_config)
+    _broken_camera(app)
+    with TestClient(app) as client:
+        with pytest.raises(WebSocketDisconnect) as refused:
+            with client.websocket_connect('/ws/video'):
+                pass
+        assert refused.value.code == 1013
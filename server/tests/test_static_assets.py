@@ -0,0 +1,66 @@
+"""Conditional requests and content negotiation for precompressed assets"""
+import pytest
+from fastapi.testclient import TestClient
+
+from raspacar_server import create_app
+from static_assets import StaticAsset, _accepted_encodings
+
+BODY = b'function drive() { return 1; }\n' * 200
+
+
+@pytest.fixture
+def asset():
+    asset = StaticAsset('app.js', BODY, 'text/javascript; charset=utf-8')
+    # brotli is optional; give every asset a br body so selection is testable
+    asset.encodings.setdefault('br', (b'br-body', f'"{asset.hash}-br"'))
+    return asset
+
+
+def test_if_none_match_names_any_representation(asset):
+    identity = f'"{asset.hash}"'
+    gzipped = f'"{asset.hash}-gzip"'
+    assert asset.matches(identity)
+    assert asset.matches(gzipped)
+    assert asset.matches(f'"stale", {gzipped}')
+    assert asset.matches(f'W/{identity}')
+    assert asset.matches(f'"other",W/{gzipped}')
+    assert asset.matches('*')
+
+
+def test_if_none_match_misses(asset):
+    assert not asset.matches(None)
+    assert not asset.matches('')
+    assert not asset.matches('"stale"')
+    assert not asset.matches(asset.hash)
+
+
+@pytest.mark.parametrize('header, encoding', [
+    ('gzip, deflate, br', 'br'),
+    ('gzip', 'gzip'),
+    ('GZIP', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('br; q=0.0, gzip;q=0.5', 'gzip'),
+    ('br;q=0, gzip;q=0', 'identity'),
+    ('deflate', 'identity'),
+    ('', 'identity'),
+    (None, 'identity'),
+])
+def test_select_encoding(asset, header, encoding):
+    selected, body, etag = asset.select(header)
+    assert selected == encoding
+    assert (body, etag) == asset.encodings[encoding]
+
+
+def test_q_zero_is_a_rejection():
+    assert _accepted_encodings('gzip;q=0, br;q=0.001, identity') == {'br', 'identity'}
+    assert _accepted_encodings('gzip;q=bogus') == {'gzip'}
+
+
+def test_page_answers_304(app_config):
+    with TestClient(create_app(app_config)) as client:
+        page = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        assert page.status_code == 200
+        again = client.get('/', headers={'Accept-Encoding': 'gzip',
+                                         'If-None-Match': f'"x", W/{page.headers["etag"]}'})
+        assert again.status_code == 304
+        assert again.content == b''
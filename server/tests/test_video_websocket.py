@@ -0,0 +1,34 @@
+"""/ws/video keeps a small window of unacked frames in flight"""
+import time
+
+from fastapi.testclient import TestClient
+
+from frame_broadcaster import WS_HEADER
+from raspacar_server import create_app
+
+WINDOW = {'video_ack_window': 3}
+
+
+def _number(message):
+    return WS_HEADER.unpack_from(message)[0]
+
+
+def test_client_without_acks_keeps_receiving(app_config):
+    with TestClient(create_app(dict(app_config, **WINDOW))) as client:
+        with client.websocket_connect('/ws/video') as ws:
+            numbers = [_number(ws.receive_bytes()) for _ in range(10)]
+    assert numbers == sorted(numbers)
+
+
+def test_window_bounds_unacked_frames(app_config):
+    with TestClient(create_app(dict(app_config, **WINDOW))) as client:
+        with client.websocket_connect('/ws/video') as ws:
+            ws.send_text(str(_number(ws.receive_bytes())))
+            # Stop acking: once the window is full, newer frames are held back
+            time.sleep(0.5)
+            numbers = []
+            for _ in range(10):
+                numbers.append(_number(ws.receive_bytes()))
+                ws.send_text(str(numbers[-1]))
+    # Frames published during the stall replaced each other in the send slot
+    assert max(b - a for a, b in zip(numbers, numbers[1:])) > 5